@@ -2,589 +2,3625 @@
 Python script to generate Word documents from Dart files with explanations
 """
 
+import argparse
+import fnmatch
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
 import os
+import posixpath
+import re
+import stat
+import sys
+import tempfile
+import time
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
-try:
+# python-docx (and lxml behind it) is imported inside the functions that build
+# documents, so listings, dry runs and up-to-date checks never pay for loading it
+DOCX_INSTALL_HINT = "pip install python-docx"
+
+# Outcome of building one entry; status is one of the STATUS_* values
+# output_paths are relative to the output directory, one per locale; over_budget marks a
+# failure from running out of time or memory, or a child that died
+BuildResult = namedtuple('BuildResult', ['file_key', 'status', 'output_paths', 'elapsed', 'error',
+                                         'stages', 'over_budget'], defaults=(None, False))
+STATUS_OK = 'ok'
+STATUS_MISSING = 'missing'
+STATUS_FAILED = 'failed'
+
+# Default and end marker of the --pipeline queues
+DEFAULT_PIPELINE_DEPTH = 4
+PIPELINE_END = object()
+
+# Bump whenever the document layout or styling changes so that every
+# output recorded in the manifest is treated as stale on the next run
+GENERATOR_VERSION = 10
+MANIFEST_FILENAME = '.manifest.json'
+
+# Named styles defined once in the base document
+DOCUMENT_FONT = 'Times New Roman'
+EXPLANATION_STYLE = 'File Explanation'
+CODE_STYLE = 'Source Code'
+HYPERLINK_STYLE = 'Hyperlink'
+SOURCE_BOOKMARK_PREFIX = '_Source_'
+
+# Highlighted code: a monospace paragraph style plus one character style per token class
+CODE_FONT = 'Consolas'
+HIGHLIGHT_CODE_STYLE = 'Highlighted Code'
+# token class -> (character style, color, bold, italic)
+HIGHLIGHT_STYLES = {
+    'keyword': ('Code Keyword', (0, 0, 160), True, False),
+    'type': ('Code Type', (38, 127, 153), False, False),
+    'string': ('Code String', (163, 21, 21), False, False),
+    'comment': ('Code Comment', (0, 128, 0), False, True),
+    'annotation': ('Code Annotation', (128, 128, 0), False, False),
+}
+
+# Default locations, relative to the Flutter project this script lives in
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LIB_PATH = os.path.join(PROJECT_ROOT, 'lib')
+DEFAULT_OUTPUT_PATH = os.path.join(PROJECT_ROOT, 'lib_documentation')
+
+# Source discovery
+DISCOVERY_CACHE_FILENAME = '.discovery_cache.json'
+DEFAULT_INCLUDE = ['*.dart']
+
+# Source lines per code paragraph; 0 writes the whole file as one paragraph
+DEFAULT_CODE_CHUNK_LINES = 200
+
+# .docx packaging: zlib level (0 stores entries uncompressed) and, with --reproducible,
+# the timestamp used for every zip entry and core-properties date unless
+# SOURCE_DATE_EPOCH is set (see reproducible-builds.org)
+DEFAULT_COMPRESS_LEVEL = 6
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+# Explanation tables, one Markdown file per locale: "## <lib path>" starts an
+# entry and "# ..." lines only group entries
+EXPLANATIONS_DIR = os.path.join(PROJECT_ROOT, 'doc_explanations')
+DEFAULT_LOCALE = 'vi'
+
+# Fixed document text per locale; documents for DEFAULT_LOCALE go in the output
+# root and every other locale gets a subdirectory named after it
+LOCALE_TEXT = {
+    'vi': {
+        'explanation_heading': 'GIẢI THÍCH FILE:',
+        'code_heading': 'MÃ NGUỒN:',
+        'outline_heading': 'CẤU TRÚC MÃ NGUỒN (tự động trích xuất):',
+        'line': 'dòng',
+        'toc_heading': 'MỤC LỤC',
+        'depends_on_heading': 'PHỤ THUỘC (import trong lib/):',
+        'used_by_heading': 'ĐƯỢC DÙNG BỞI:',
+        'none': '(không có)',
+        'l10n_title': 'PHỤ LỤC: CHUỖI GIAO DIỆN ĐA NGÔN NGỮ (lib/l10n)',
+        'l10n_summary': 'Tổng số khóa: {total}',
+        'l10n_missing': '{language}: thiếu {count} khóa',
+        'l10n_key': 'Khóa',
+        'l10n_placeholders': 'Tham số',
+        'l10n_missing_cell': '⚠ (thiếu)',
+        'languages': {'en': 'Tiếng Anh', 'vi': 'Tiếng Việt'},
+        'workbook_heading': 'FILE EXCEL MẪU (tự động đọc từ thư mục dự án):',
+        'workbook_schema': '{name} – trang "{sheet}": {rows} dòng dữ liệu, {columns} cột',
+        'workbook_sample': '{count} dòng đầu tiên:',
+        'workbook_column': 'Cột',
+        'workbook_header': 'Tiêu đề',
+        'workbook_type': 'Kiểu dữ liệu',
+        'workbook_nulls': 'Ô trống',
+        'cell_types': {'str': 'chuỗi', 'int': 'số nguyên', 'float': 'số thực', 'bool': 'đúng/sai',
+                       'datetime': 'ngày giờ', 'date': 'ngày', 'time': 'giờ',
+                       'timedelta': 'khoảng thời gian'},
+        'fallback': 'MỤC ĐÍCH FILE:\nChưa có giải thích cho file này.',
+        'kinds': {
+            'class': 'class',
+            'mixin': 'mixin',
+            'enum': 'enum',
+            'extension': 'extension',
+            'function': 'hàm',
+            'method': 'phương thức',
+            'constructor': 'hàm khởi tạo',
+            'getter': 'getter',
+        },
+    },
+    'en': {
+        'explanation_heading': 'FILE EXPLANATION:',
+        'code_heading': 'SOURCE CODE:',
+        'outline_heading': 'CODE STRUCTURE (auto-extracted):',
+        'line': 'line',
+        'toc_heading': 'CONTENTS',
+        'depends_on_heading': 'DEPENDS ON (imports within lib/):',
+        'used_by_heading': 'USED BY:',
+        'none': '(none)',
+        'l10n_title': 'APPENDIX: LOCALIZED UI STRINGS (lib/l10n)',
+        'l10n_summary': 'Total keys: {total}',
+        'l10n_missing': '{language}: {count} keys missing',
+        'l10n_key': 'Key',
+        'l10n_placeholders': 'Placeholders',
+        'l10n_missing_cell': '⚠ (missing)',
+        'languages': {'en': 'English', 'vi': 'Vietnamese'},
+        'workbook_heading': 'SAMPLE EXCEL FILES (read automatically from the project folder):',
+        'workbook_schema': '{name} – sheet "{sheet}": {rows} data rows, {columns} columns',
+        'workbook_sample': 'First {count} rows:',
+        'workbook_column': 'Column',
+        'workbook_header': 'Header',
+        'workbook_type': 'Data type',
+        'workbook_nulls': 'Empty cells',
+        'cell_types': {'str': 'text', 'int': 'integer', 'float': 'decimal', 'bool': 'boolean',
+                       'datetime': 'date and time', 'date': 'date', 'time': 'time',
+                       'timedelta': 'duration'},
+        'fallback': 'FILE PURPOSE:\nNo explanation has been written for this file yet.',
+        'kinds': {
+            'class': 'class',
+            'mixin': 'mixin',
+            'enum': 'enum',
+            'extension': 'extension',
+            'function': 'function',
+            'method': 'method',
+            'constructor': 'constructor',
+            'getter': 'getter',
+        },
+    },
+}
+
+def load_explanations(locale):
+    """Parse doc_explanations/<locale>.md into an ordered {lib path: explanation} dict"""
+    explanations = {}
+    file_key = None
+    body = []
+    
+    def flush():
+        if file_key is not None:
+            explanations[file_key] = '\n'.join(body).strip('\n')
+    
+    with open(os.path.join(EXPLANATIONS_DIR, f'{locale}.md'), 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('## '):
+                flush()
+                file_key = line[3:].strip()
+                body = []
+            elif line.startswith('# '):
+                flush()
+                file_key = None
+            elif file_key is not None:
+                body.append(line)
+    flush()
+    return explanations
+
+# File explanations mapping - Vietnamese; its order is the document order
+file_explanations = load_explanations(DEFAULT_LOCALE)
+
+class StageProfiler:
+    """Wall time and allocated bytes per stage, grouped by the file being built"""
+    
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.current_file = None
+        self.records = {}  # file_key -> {stage: [seconds, bytes]}
+        if track_memory:
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+    
+    @contextmanager
+    def stage(self, name, file_key=None):
+        file_key = file_key or self.current_file
+        if self.track_memory:
+            self._tracemalloc.reset_peak()
+            base = self._tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            allocated = self._tracemalloc.get_traced_memory()[1] - base if self.track_memory else 0
+            record = self.records.setdefault(file_key, {}).setdefault(name, [0.0, 0])
+            record[0] += elapsed
+            record[1] += allocated
+    
+    def take(self, file_key):
+        """Remove and return the stage records of one file"""
+        return self.records.pop(file_key, {})
+    
+    def merge(self, file_key, stages):
+        for name, (elapsed, allocated) in (stages or {}).items():
+            record = self.records.setdefault(file_key, {}).setdefault(name, [0.0, 0])
+            record[0] += elapsed
+            record[1] += allocated
+    
+    def print_report(self, top=10):
+        """Print the slowest files and the stages aggregated over all files"""
+        if not self.records:
+            return
+        totals = {}
+        for stages in self.records.values():
+            for name, (elapsed, allocated) in stages.items():
+                total = totals.setdefault(name, [0.0, 0, 0])
+                total[0] += elapsed
+                total[1] += allocated
+                total[2] += 1
+        
+        print()
+        print(f"{'Giai đoạn':<14}{'tổng (s)':>10}{'tb/file (ms)':>14}{'cấp phát (KB)':>15}")
+        for name, (elapsed, allocated, count) in sorted(totals.items(), key=lambda item: -item[1][0]):
+            allocated = f'{allocated / 1024:.0f}' if self.track_memory else '—'
+            print(f"{name:<14}{elapsed:>10.3f}{elapsed / count * 1000:>14.1f}{allocated:>15}")
+        
+        slowest = sorted(self.records.items(), key=lambda item: -sum(v[0] for v in item[1].values()))
+        print()
+        print(f"{top} file chậm nhất:")
+        for file_key, stages in slowest[:top]:
+            breakdown = ', '.join(f'{name} {elapsed * 1000:.0f}ms'
+                                  for name, (elapsed, _) in sorted(stages.items(), key=lambda item: -item[1][0]))
+            total = sum(elapsed for elapsed, _ in stages.values())
+            print(f"  {total:>7.3f}s  {file_key}  ({breakdown})")
+
+_profiler = None
+_NO_PROFILE = nullcontext()
+
+def enable_profiling(track_memory=True):
+    """Turn stage profiling on for this process; also used as the worker pool initializer"""
+    global _profiler
+    _profiler = StageProfiler(track_memory)
+    return _profiler
+
+def profile_stage(name, file_key=None):
+    """Context manager timing one stage; a shared no-op when profiling is off"""
+    if _profiler is None:
+        return _NO_PROFILE
+    return _profiler.stage(name, file_key)
+
+def require_docx():
+    """Stop with an install hint when python-docx is missing, without importing it"""
+    if importlib.util.find_spec('docx') is None:
+        sys.exit(f"✗ Thiếu thư viện python-docx, hãy cài đặt: {DOCX_INSTALL_HINT}")
+
+def _set_style_font(style, size, rgb=None, name=DOCUMENT_FONT):
+    """Give a style the document font, overriding any theme font it inherits"""
+    from docx.oxml.ns import qn
+    from docx.shared import Pt
+    
+    font = style.font
+    font.name = name
+    font.size = Pt(size)
+    if rgb is not None:
+        font.color.rgb = rgb
+    r_fonts = style.element.rPr.rFonts
+    for attr in ('w:asciiTheme', 'w:hAnsiTheme', 'w:eastAsiaTheme', 'w:cstheme'):
+        r_fonts.attrib.pop(qn(attr), None)
+
+def build_base_document():
+    """Serialize an empty document whose heading, explanation and code styles are defined once"""
     from docx import Document
+    from docx.enum.style import WD_STYLE_TYPE
     from docx.shared import Pt, RGBColor
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-except ImportError:
-    print("Installing required package: python-docx")
-    import subprocess
-    subprocess.check_call(["pip", "install", "python-docx"])
+    
+    doc = Document()
+    styles = doc.styles
+    
+    _set_style_font(styles['Normal'], 13)
+    _set_style_font(styles['Heading 1'], 13, RGBColor(0, 0, 255))
+    _set_style_font(styles['Heading 2'], 13, RGBColor(0, 100, 200))
+    
+    for style_name in (EXPLANATION_STYLE, CODE_STYLE):
+        style = styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = styles['Normal']
+        style.quick_style = True
+        style.paragraph_format.line_spacing = 1.15
+    # Consecutive code chunks must read as one continuous block
+    styles[CODE_STYLE].paragraph_format.space_after = Pt(0)
+    
+    highlighted = styles.add_style(HIGHLIGHT_CODE_STYLE, WD_STYLE_TYPE.PARAGRAPH)
+    highlighted.base_style = styles[CODE_STYLE]
+    highlighted.quick_style = True
+    _set_style_font(highlighted, 10, name=CODE_FONT)
+    for style_name, rgb, bold, italic in HIGHLIGHT_STYLES.values():
+        font = styles.add_style(style_name, WD_STYLE_TYPE.CHARACTER).font
+        font.color.rgb = RGBColor(*rgb)
+        font.bold = bold or None
+        font.italic = italic or None
+    
+    # Cross-reference links in the combined handbook
+    hyperlink = styles.add_style(HYPERLINK_STYLE, WD_STYLE_TYPE.CHARACTER).font
+    hyperlink.color.rgb = RGBColor(0x05, 0x63, 0xC1)
+    hyperlink.underline = True
+    
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+_base_document_bytes = None
+
+def base_document_bytes():
+    """Return the styled base document, building it once per process"""
+    global _base_document_bytes
+    if _base_document_bytes is None:
+        _base_document_bytes = build_base_document()
+    return _base_document_bytes
+
+def new_document():
+    """Stamp a fresh Document from the styled base"""
     from docx import Document
-    from docx.shared import Pt, RGBColor
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    return Document(io.BytesIO(base_document_bytes()))
+
+def strip_line_end(text):
+    """Drop the one newline that ends a chunk; blank lines before it are code"""
+    return text[:-1] if text.endswith('\n') else text
+
+def iter_code_chunks(lines, chunk_lines):
+    """Group source lines into chunks of at most chunk_lines, without the final newline"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if chunk_lines and len(chunk) >= chunk_lines:
+            yield strip_line_end(''.join(chunk))
+            chunk = []
+    if chunk:
+        yield strip_line_end(''.join(chunk))
+
+def decode_source(data):
+    """Decode source bytes with the newline translation open(..., 'r') would apply"""
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8').read()
+
+def iter_source_chunks(file_path, options, source=None):
+    """Yield the code section's chunks: plain text, or with options['highlight'] a list of
+    (token class, text) runs per chunk. Highlighting tokenizes the whole file at once,
+    since strings and comments may span chunk boundaries. source, when given, is the
+    already decoded file and file_path is not opened."""
+    chunk_lines = options.get('code_chunk_lines', DEFAULT_CODE_CHUNK_LINES)
+    with open(file_path, 'r', encoding='utf-8') if source is None else io.StringIO(source) as f:
+        if options.get('highlight'):
+            yield from iter_highlighted_chunks(f.read(), chunk_lines)
+        else:
+            yield from iter_code_chunks(f, chunk_lines)
+
+def add_code_section(doc, file_path, options, code=None):
+    """Stream a source file into bounded code paragraphs, one chunk at a time;
+    code, when given, is the chunk list from read_code_chunks shared between locales"""
+    chunks = iter_source_chunks(file_path, options) if code is None else code
+    if not options.get('highlight'):
+        for chunk in chunks:
+            doc.add_paragraph(chunk, style=CODE_STYLE)
+        return
+    # A run object per token is most of the build time, so each chunk is rendered as
+    # escaped XML by iter_code_xml and parsed in one go, then placed before sectPr
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+    
+    style_names = [HIGHLIGHT_CODE_STYLE] + [style_name for style_name, *_ in HIGHLIGHT_STYLES.values()]
+    style_ids = {style_name: doc.styles[style_name].style_id for style_name in style_names}
+    paragraph_start = f'<w:p {nsdecls("w")}'
+    body = doc.element.body
+    sect_pr = body.sectPr
+    for paragraph_xml in iter_code_xml(chunks, options, style_ids):
+        paragraph = parse_xml(paragraph_start + paragraph_xml[len('<w:p'):])
+        if sect_pr is not None:
+            sect_pr.addprevious(paragraph)
+        else:
+            body.append(paragraph)
+
+def source_bookmark_name(source_hash):
+    """Hidden bookmark on the code heading that records which source the document shows;
+    Word limits bookmark names to 40 characters, so the hash is cut to 128 bits"""
+    return SOURCE_BOOKMARK_PREFIX + source_hash[:32]
+
+def add_source_bookmark(paragraph, source_hash):
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    
+    start = OxmlElement('w:bookmarkStart')
+    start.set(qn('w:id'), '0')
+    start.set(qn('w:name'), source_bookmark_name(source_hash))
+    end = OxmlElement('w:bookmarkEnd')
+    end.set(qn('w:id'), '0')
+    run = paragraph.runs[0]._r
+    run.addprevious(start)
+    run.addnext(end)
+
+def read_code_chunks(file_path, options, source=None):
+    """Read the code chunks once so several documents can share them"""
+    return list(iter_source_chunks(file_path, options, source))
+
+def docx_code(chunks, options):
+    """python-docx takes the shared chunks as they are"""
+    return chunks
+
+def build_word_document(file_path, file_key, explanation, options, outline=None,
+                        locale=DEFAULT_LOCALE, code=None, xref=None, source_hash=None,
+                        workbooks=None):
+    """Lay out one Dart file as an in-memory python-docx Document"""
+    text = LOCALE_TEXT[locale]
+    # File name, on a Word document created from the styled base
+    with profile_stage('heading'):
+        doc = new_document()
+        doc.add_heading(f'File: {file_key}', level=1)
+        doc.add_paragraph()
+    
+    # Explanation section
+    with profile_stage('explanation'):
+        doc.add_heading(text['explanation_heading'], level=2)
+        doc.add_paragraph(explanation, style=EXPLANATION_STYLE)
+        if outline:
+            doc.add_paragraph(outline_section_text(outline, locale), style=EXPLANATION_STYLE)
+        if xref is not None:
+            doc.add_paragraph(xref_section_text(xref, locale), style=EXPLANATION_STYLE)
+        if workbooks:
+            add_workbook_section(doc, workbooks, locale)
+        doc.add_paragraph()
+    
+    # Code section
+    with profile_stage('code'):
+        heading = doc.add_heading(text['code_heading'], level=2)
+        if source_hash is not None:
+            add_source_bookmark(heading, source_hash)
+        add_code_section(doc, file_path, options, code)
+    
+    return doc
+
+def word_document_bytes(doc, options=None):
+    with profile_stage('save'):
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        if options and needs_repackage(options):
+            return repackage(buffer.getvalue(), options)
+        return buffer.getvalue()
+
+def save_word_document(doc, output_path, options=None):
+    data = word_document_bytes(doc, options)
+    with profile_stage('save'):
+        write_if_changed(output_path, data)
+
+def create_word_document(file_path, file_key, explanation, output_dir, options=None, outline=None,
+                         locale=DEFAULT_LOCALE, code=None, xref=None, source_hash=None,
+                         workbooks=None):
+    """Create a Word document for a single Dart file and return its output path"""
+    doc = build_word_document(file_path, file_key, explanation, options or {}, outline, locale, code,
+                              xref, source_hash, workbooks)
+    
+    # Save document
+    output_path = os.path.join(output_dir, output_filename_for(file_key))
+    save_word_document(doc, output_path, options)
+    
+    return output_path
+
+# Characters lxml refuses in text nodes; the fast engine rejects them the same way
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_RUN_BREAKS = re.compile('([\t\n\r])')
+_BREAK_XML = {'\t': '<w:tab/>', '\n': '<w:br/>', '\r': '<w:br/>'}
+
+EMPTY_PARAGRAPH_XML = '<w:p/>'
+PARAGRAPH_XML = '<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr><w:r>{run}</w:r></w:p>'
+PARAGRAPH_START_XML = '<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>'
+STYLED_RUN_START_XML = '<w:r><w:rPr><w:rStyle w:val="{style_id}"/></w:rPr>'
+
+_CORE_DATES = re.compile(r'(<dcterms:(created|modified)\b[^>]*>)[^<]*(</dcterms:\2>)')
+
+def reproducible_date_time():
+    """Zip timestamp for reproducible packages: SOURCE_DATE_EPOCH if set, else ZIP_EPOCH"""
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if not epoch:
+        return ZIP_EPOCH
+    # Zip timestamps cannot predate 1980
+    return max(tuple(time.gmtime(int(epoch))[:6]), ZIP_EPOCH)
+
+def package_order(names):
+    """Canonical entry order shared by both engines: [Content_Types].xml first,
+    word/document.xml last and everything else sorted by name"""
+    first, last = '[Content_Types].xml', 'word/document.xml'
+    return ([first] if first in names else []) + sorted(
+        name for name in names if name not in (first, last)) + ([last] if last in names else [])
+
+def zip_entry(name, options):
+    """ZipInfo for one package entry; reproducible entries carry no host time or platform"""
+    if options.get('reproducible'):
+        info = zipfile.ZipInfo(name, reproducible_date_time())
+        info.create_system = 0
+        info.external_attr = 0o644 << 16
+    else:
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.external_attr = 0o600 << 16
+    level = options.get('compress_level', DEFAULT_COMPRESS_LEVEL)
+    info.compress_type = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+    # writestr() and open(info, 'w') take the level from the entry; renamed in Python 3.13
+    setattr(info, 'compress_level' if hasattr(info, 'compress_level') else '_compresslevel',
+            level or None)
+    return info
+
+def write_entry(package, name, data, options):
+    package.writestr(zip_entry(name, options), data)
+
+def pin_core_properties(data, options):
+    """Replace the created/modified dates in docProps/core.xml with the reproducible timestamp"""
+    if not options.get('reproducible'):
+        return data
+    stamp = '%04d-%02d-%02dT%02d:%02d:%02dZ' % reproducible_date_time()
+    return _CORE_DATES.sub(lambda m: m.group(1) + stamp + m.group(3), data.decode('utf-8')).encode('utf-8')
+
+def repackage(data, options):
+    """Rewrite a saved .docx in canonical order with the requested timestamps and level"""
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as source, \
+            zipfile.ZipFile(output, 'w') as package:
+        for name in package_order(source.namelist()):
+            entry = source.read(name)
+            if name == 'docProps/core.xml':
+                entry = pin_core_properties(entry, options)
+            write_entry(package, name, entry, options)
+    return output.getvalue()
+
+def needs_repackage(options):
+    return bool(options.get('reproducible')) or \
+        options.get('compress_level', DEFAULT_COMPRESS_LEVEL) != DEFAULT_COMPRESS_LEVEL
+
+def write_if_changed(output_path, data):
+    """Write data unless the file already holds exactly these bytes; return True if written.
+    Unchanged files keep their mtime, so caches and version control see no churn."""
+    try:
+        if os.path.getsize(output_path) == len(data):
+            with open(output_path, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    return True
+
+# mkstemp creates its files 0600; the umask is read once, at import, since reading it
+# means setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def publish_temp_file(temp_path, output_path):
+    """Move a finished temp file over output_path with the mode a plain open() would give
+    it, or the mode of the file it replaces"""
+    try:
+        mode = stat.S_IMODE(os.stat(output_path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(temp_path, mode)
+    os.replace(temp_path, output_path)
+
+def replace_if_changed(temp_path, output_path):
+    """Move a finished temp file over output_path, or drop it when the contents match"""
+    import filecmp
+    
+    if os.path.exists(output_path) and filecmp.cmp(temp_path, output_path, shallow=False):
+        os.remove(temp_path)
+        return False
+    publish_temp_file(temp_path, output_path)
+    return True
+
+_fast_parts = None
+_static_packages = {}
+
+def fast_parts():
+    """Split the styled base into its static parts, in package order, and the
+    document.xml shell, once per process"""
+    global _fast_parts
+    if _fast_parts is None:
+        with zipfile.ZipFile(io.BytesIO(base_document_bytes())) as base:
+            static_entries = [(name, base.read(name)) for name in package_order(base.namelist())
+                              if name != 'word/document.xml']
+            document_xml = base.read('word/document.xml').decode('utf-8')
+        body_start = document_xml.index('<w:body>') + len('<w:body>')
+        sect_start = document_xml.rindex('<w:sectPr')
+        style_names = ['Heading 1', 'Heading 2', 'TOC Heading', EXPLANATION_STYLE, CODE_STYLE,
+                       HIGHLIGHT_CODE_STYLE, HYPERLINK_STYLE]
+        style_names.extend(style_name for style_name, *_ in HIGHLIGHT_STYLES.values())
+        style_ids = {name: name.replace(' ', '') for name in style_names}
+        _fast_parts = (static_entries, document_xml[:body_start],
+                       document_xml[sect_start:], style_ids)
+    return _fast_parts
+
+def xml_escape(text):
+    """Same escaping as xml.sax.saxutils.escape, which would pull in urllib at import time"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def run_xml(text):
+    """Escape text into run content, mapping tabs and line breaks the way python-docx does"""
+    if _INVALID_XML_CHARS.search(text):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, '
+                         'no NULL bytes or control characters')
+    parts = []
+    for piece in _RUN_BREAKS.split(text):
+        if piece in _BREAK_XML:
+            parts.append(_BREAK_XML[piece])
+        elif piece:
+            parts.append(f'<w:t xml:space="preserve">{xml_escape(piece)}</w:t>')
+    return ''.join(parts)
+
+def paragraph_xml(text, style_id):
+    return PARAGRAPH_XML.format(style_id=style_id, run=run_xml(text))
+
+def iter_code_xml(chunks, options, style_ids):
+    if not options.get('highlight'):
+        for chunk in chunks:
+            yield paragraph_xml(chunk, style_ids[CODE_STYLE])
+        return
+    # Opening tag of a run for each token class, built once per file
+    run_starts = {kind: STYLED_RUN_START_XML.format(style_id=style_ids[style_name])
+                  for kind, (style_name, *_) in HIGHLIGHT_STYLES.items()}
+    run_starts[None] = '<w:r>'
+    paragraph_start = PARAGRAPH_START_XML.format(style_id=style_ids[HIGHLIGHT_CODE_STYLE])
+    for runs in chunks:
+        yield paragraph_start + ''.join(run_starts[kind] + run_xml(text) + '</w:r>'
+                                        for kind, text in runs) + '</w:p>'
+
+def render_code_xml(chunks, options):
+    """Escape and encode the code section once so several locale documents can share it"""
+    return ''.join(iter_code_xml(chunks, options, fast_parts()[3])).encode('utf-8')
+
+HYPERLINK_XML = ('<w:hyperlink w:anchor="{name}" w:history="1"><w:r><w:rPr>'
+                 '<w:rStyle w:val="{style_id}"/></w:rPr>{run}</w:r></w:hyperlink>')
+
+def xref_xml(xref, locale, style_ids, anchors=None):
+    """The "depends on / used by" paragraph; with anchors (file key -> bookmark), as in
+    the combined handbook, every listed file links to its section"""
+    if not anchors:
+        return paragraph_xml(xref_section_text(xref, locale), style_ids[EXPLANATION_STYLE])
+    parts = [PARAGRAPH_START_XML.format(style_id=style_ids[EXPLANATION_STYLE])]
+    for index, (line, file_key) in enumerate(xref_lines(xref, locale)):
+        line_break = '<w:br/>' if index else ''
+        if file_key in anchors:
+            parts.append(f'<w:r>{line_break}{run_xml("- ")}</w:r>')
+            parts.append(HYPERLINK_XML.format(name=anchors[file_key], run=run_xml(file_key),
+                                              style_id=style_ids[HYPERLINK_STYLE]))
+        else:
+            parts.append(f'<w:r>{line_break}{run_xml(line)}</w:r>')
+    parts.append('</w:p>')
+    return ''.join(parts)
+
+def iter_body_xml(file_path, file_key, explanation, options, outline, style_ids, title_xml=None,
+                  locale=DEFAULT_LOCALE, code=None, xref=None, anchors=None, source_hash=None,
+                  workbooks=None):
+    """Yield the body paragraphs of one file's section, streaming the code chunks
+    unless code already holds them as rendered by render_code_xml"""
+    text = LOCALE_TEXT[locale]
+    yield title_xml or paragraph_xml(f'File: {file_key}', style_ids['Heading 1'])
+    yield EMPTY_PARAGRAPH_XML
+    yield paragraph_xml(text['explanation_heading'], style_ids['Heading 2'])
+    yield paragraph_xml(explanation, style_ids[EXPLANATION_STYLE])
+    if outline:
+        yield paragraph_xml(outline_section_text(outline, locale), style_ids[EXPLANATION_STYLE])
+    if xref is not None:
+        yield xref_xml(xref, locale, style_ids, anchors)
+    if workbooks:
+        yield from iter_workbook_xml(workbooks, style_ids, locale)
+    yield EMPTY_PARAGRAPH_XML
+    if source_hash is not None:
+        yield BOOKMARK_TITLE_XML.format(style_id=style_ids['Heading 2'], id=0,
+                                        name=source_bookmark_name(source_hash),
+                                        run=run_xml(text['code_heading']))
+    else:
+        yield paragraph_xml(text['code_heading'], style_ids['Heading 2'])
+    if code is not None:
+        yield code
+    else:
+        yield from iter_code_xml(iter_source_chunks(file_path, options), options, style_ids)
+
+def iter_document_xml(file_path, file_key, explanation, options, outline=None,
+                      locale=DEFAULT_LOCALE, code=None, xref=None, source_hash=None,
+                      workbooks=None):
+    """Yield word/document.xml for one Dart file from the OOXML templates, piece by
+    piece, for write_document_xml to stream into the package"""
+    _, document_head, document_tail, style_ids = fast_parts()
+    yield document_head
+    yield from iter_body_xml(file_path, file_key, explanation, options, outline, style_ids,
+                             locale=locale, code=code, xref=xref, source_hash=source_hash,
+                             workbooks=workbooks)
+    yield document_tail
+
+def write_document_xml(package, document_xml, options):
+    """Stream the pieces of word/document.xml into its package entry as they are
+    rendered, so the whole part is never held at once; pieces shared between
+    documents (render_code_xml) come already encoded"""
+    with package.open(zip_entry('word/document.xml', options), 'w') as stream:
+        for xml in document_xml:
+            stream.write(xml if isinstance(xml, bytes) else xml.encode('utf-8'))
+
+def static_package(options):
+    """The static parts compressed once per process for each packaging choice"""
+    key = (bool(options.get('reproducible')),
+           options.get('compress_level', DEFAULT_COMPRESS_LEVEL))
+    if key not in _static_packages:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as package:
+            for name, data in fast_parts()[0]:
+                if name == 'docProps/core.xml':
+                    data = pin_core_properties(data, options)
+                write_entry(package, name, data, options)
+        _static_packages[key] = buffer.getvalue()
+    return _static_packages[key]
+
+def document_xml_package(document_xml, options=None):
+    """Append the only per-file part to a copy of the already compressed static parts.
+    document_xml is rendered while it is compressed, so the build is timed as save."""
+    options = options or {}
+    with profile_stage('save'):
+        buffer = io.BytesIO(static_package(options))
+        with zipfile.ZipFile(buffer, 'a') as package:
+            write_document_xml(package, document_xml, options)
+        return buffer.getvalue()
+
+def save_document_xml(document_xml, output_path, options=None):
+    data = document_xml_package(document_xml, options)
+    with profile_stage('save'):
+        write_if_changed(output_path, data)
+
+def create_word_document_fast(file_path, file_key, explanation, output_dir, options=None,
+                              outline=None, locale=DEFAULT_LOCALE, code=None, xref=None,
+                              source_hash=None, workbooks=None):
+    """Write the same document as create_word_document straight from OOXML templates"""
+    document_xml = iter_document_xml(file_path, file_key, explanation, options or {}, outline,
+                                     locale, code, xref, source_hash, workbooks)
+    output_path = os.path.join(output_dir, output_filename_for(file_key))
+    save_document_xml(document_xml, output_path, options)
+    return output_path
+
+ENGINES = {
+    'docx': create_word_document,
+    'fast': create_word_document_fast,
+}
 
-# File explanations mapping - Vietnamese
-file_explanations = {
-    "main.dart": """MỤC ĐÍCH FILE:
-Đây là điểm khởi đầu của ứng dụng Flutter. File này khởi tạo ứng dụng, thiết lập xác thực Supabase, cấu hình đa ngôn ngữ và quản lý luồng xác thực người dùng.
+# Per-engine form of the code chunks, prepared once per file and shared by all locales
+ENGINE_CODE = {
+    'docx': docx_code,
+    'fast': render_code_xml,
+}
 
-CÁC CHỨC NĂNG CHÍNH:
-- main(): Khởi tạo Flutter bindings và Supabase, sau đó chạy ứng dụng
-- MedEquipApp: Widget gốc cấu hình MaterialApp với theme, đa ngôn ngữ và định tuyến
-- AuthGate: Xử lý kiểm tra trạng thái xác thực và chuyển hướng người dùng đến các màn hình phù hợp dựa trên trạng thái đăng nhập""",
-
-    # Constants
-    "constants/app_colors.dart": """MỤC ĐÍCH FILE:
-Định nghĩa bảng màu được sử dụng trong toàn bộ ứng dụng để đảm bảo giao diện nhất quán.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Cung cấp các định nghĩa màu tập trung
-- Đảm bảo thiết kế trực quan nhất quán trong toàn ứng dụng""",
-
-    "constants/app_theme.dart": """MỤC ĐÍCH FILE:
-Định nghĩa cấu hình theme của ứng dụng bao gồm cài đặt theme sáng và tối.
+# The same engines split into (build, save) so the two stages can be timed apart; the
+# fast engine's build is lazy and renders while it saves
+ENGINE_STAGES = {
+    'docx': (build_word_document, save_word_document),
+    'fast': (iter_document_xml, save_document_xml),
+}
 
-CÁC CHỨC NĂNG CHÍNH:
-- Cấu hình các thuộc tính theme của MaterialApp
-- Thiết lập các bảng màu, kiểu chữ và theme cho các component
-- Cung cấp giao diện nhất quán cho toàn bộ ứng dụng""",
-
-    "constants/constants.dart": """MỤC ĐÍCH FILE:
-Chứa các hằng số toàn cục được sử dụng trong toàn ứng dụng như API keys, URLs và các giá trị cấu hình.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Lưu trữ Supabase URL và API keys
-- Định nghĩa các giá trị hằng số của ứng dụng
-- Tập trung quản lý cấu hình""",
-
-    "constants/database_translations.dart": """MỤC ĐÍCH FILE:
-Quản lý bản dịch và ánh xạ các giá trị cơ sở dữ liệu sang văn bản thân thiện với người dùng bằng nhiều ngôn ngữ.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Dịch các giá trị enum của database sang văn bản dễ hiểu
-- Hỗ trợ đa ngôn ngữ
-- Ánh xạ các mã trạng thái sang nhãn dễ đọc""",
-
-    # Models
-    "models/audit_log.dart": """MỤC ĐÍCH FILE:
-Mô hình dữ liệu cho các bản ghi nhật ký kiểm toán theo dõi tất cả hoạt động và thay đổi trong hệ thống.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Đại diện cho các bản ghi theo dõi hoạt động
-- Theo dõi ai, làm gì, khi nào và ở đâu
-- Cung cấp serialization/deserialization cho các thao tác database""",
-
-    "models/borrow_request.dart": """MỤC ĐÍCH FILE:
-Mô hình dữ liệu đại diện cho các yêu cầu mượn thiết bị do người dùng tạo.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Lưu trữ thông tin chi tiết về việc mượn (người mượn, thiết bị, ngày tháng, trạng thái)
-- Quản lý vòng đời yêu cầu mượn
-- Cung cấp serialization/deserialization cho các thao tác database""",
-
-    "models/category.dart": """MỤC ĐÍCH FILE:
-Mô hình dữ liệu cho các danh mục thiết bị được sử dụng để tổ chức và phân loại thiết bị y tế.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Đại diện cho các danh mục thiết bị
-- Lưu trữ metadata của danh mục (tên, mô tả, ID)
-- Cung cấp serialization/deserialization cho các thao tác database""",
-
-    "models/equipment.dart": """MỤC ĐÍCH FILE:
-Mô hình dữ liệu cốt lõi đại diện cho các mục thiết bị y tế trong hệ thống.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Lưu trữ thông tin thiết bị toàn diện (tên, số serial, trạng thái, danh mục, vị trí)
-- Quản lý vòng đời và tình trạng sẵn có của thiết bị
-- Cung cấp serialization/deserialization cho các thao tác database""",
-
-    "models/inventory_log.dart": """MỤC ĐÍCH FILE:
-Mô hình dữ liệu để theo dõi các thay đổi hàng tồn kho và chuyển động kho.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Ghi lại các giao dịch hàng tồn kho
-- Theo dõi thay đổi số lượng và lý do
-- Cung cấp nhật ký kiểm toán cho quản lý hàng tồn kho""",
-
-    "models/user.dart": """MỤC ĐÍCH FILE:
-Mô hình dữ liệu đại diện cho người dùng hệ thống với vai trò và quyền hạn của họ.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Lưu trữ thông tin hồ sơ người dùng
-- Quản lý vai trò và dữ liệu xác thực của người dùng
-- Cung cấp serialization/deserialization cho các thao tác database""",
-
-    "models/user_settings.dart": """MỤC ĐÍCH FILE:
-Mô hình dữ liệu để lưu trữ tùy chọn người dùng và cài đặt ứng dụng.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Quản lý cài đặt cụ thể của người dùng (ngôn ngữ, thông báo, theme)
-- Lưu trữ tùy chọn người dùng
-- Cung cấp serialization/deserialization cho các thao tác database""",
-
-    # Providers
-    "providers/locale_provider.dart": """MỤC ĐÍCH FILE:
-Provider quản lý trạng thái để xử lý thay đổi ngôn ngữ/locale của ứng dụng.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Quản lý trạng thái locale hiện tại
-- Lưu trữ tùy chọn ngôn ngữ
-- Thông báo cho các widget khi locale thay đổi
-- Tích hợp với cài đặt người dùng""",
-
-    # Services
-    "services/audit_log_service.dart": """MỤC ĐÍCH FILE:
-Lớp service để quản lý nhật ký kiểm toán - ghi lại và truy xuất nhật ký hoạt động của hệ thống.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tạo các mục nhật ký kiểm toán cho tất cả các hành động hệ thống
-- Truy xuất nhật ký kiểm toán với bộ lọc và phân trang
-- Cung cấp dấu vết kiểm toán để tuân thủ và gỡ lỗi""",
-
-    "services/auth_service.dart": """MỤC ĐÍCH FILE:
-Xử lý tất cả các thao tác xác thực bao gồm đăng nhập, đăng ký, đặt lại mật khẩu và quản lý phiên.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Quản lý xác thực người dùng với Supabase
-- Xử lý các thao tác đăng nhập/đăng ký/đăng xuất
-- Quản lý chức năng đặt lại mật khẩu
-- Duy trì trạng thái phiên người dùng""",
-
-    "services/borrow_service.dart": """MỤC ĐÍCH FILE:
-Lớp service để quản lý các thao tác mượn thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tạo và cập nhật yêu cầu mượn
-- Quản lý quy trình phê duyệt/từ chối
-- Xử lý quy trình trả thiết bị
-- Truy xuất lịch sử mượn và yêu cầu đang hoạt động""",
-
-    "services/data_service.dart": """MỤC ĐÍCH FILE:
-Service dữ liệu cốt lõi cung cấp các thao tác CRUD cho tất cả các thực thể database.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Lớp truy cập dữ liệu chung cho các thao tác Supabase
-- Xử lý các thao tác tạo, đọc, cập nhật, xóa
-- Cung cấp truy xuất dữ liệu với bộ lọc và sắp xếp
-- Quản lý mối quan hệ giữa các thực thể""",
-
-    "services/email_notification_service.dart": """MỤC ĐÍCH FILE:
-Quản lý thông báo email cho các sự kiện hệ thống khác nhau.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Gửi thông báo email cho yêu cầu mượn
-- Thông báo cho người dùng về các sự kiện phê duyệt/từ chối/trả
-- Tích hợp với nhà cung cấp dịch vụ email
-- Xử lý mẫu và định dạng email""",
-
-    "services/equipment_identifier_service.dart": """MỤC ĐÍCH FILE:
-Service để tạo và xác thực mã định danh thiết bị duy nhất.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tạo ID thiết bị duy nhất
-- Xác thực định dạng mã định danh
-- Đảm bảo tính duy nhất trong toàn hệ thống
-- Quản lý các schema mã định danh""",
-
-    "services/excel_import_service.dart": """MỤC ĐÍCH FILE:
-Xử lý nhập dữ liệu thiết bị từ file Excel.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Phân tích file Excel chứa dữ liệu thiết bị
-- Xác thực dữ liệu được nhập
-- Nhập hàng loạt thiết bị vào database
-- Cung cấp xem trước nhập và báo cáo lỗi""",
-
-    "services/metadata_service.dart": """MỤC ĐÍCH FILE:
-Quản lý metadata hệ thống và dữ liệu tham chiếu.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Truy xuất dữ liệu tra cứu (danh mục, trạng thái, v.v.)
-- Cache metadata được truy cập thường xuyên
-- Cung cấp tùy chọn dropdown cho các form""",
-
-    "services/qr_code_service.dart": """MỤC ĐÍCH FILE:
-Xử lý tạo mã QR và các thao tác quét cho thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tạo mã QR cho thiết bị
-- Quét và giải mã mã QR
-- Liên kết mã QR với bản ghi thiết bị
-- Cho phép tra cứu thiết bị nhanh qua quét QR""",
-
-    "services/statistics_service.dart": """MỤC ĐÍCH FILE:
-Cung cấp dữ liệu thống kê và phân tích cho dashboard và báo cáo.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tính toán thống kê sử dụng thiết bị
-- Tạo xu hướng mượn và phân tích
-- Cung cấp dữ liệu cho biểu đồ và báo cáo
-- Tổng hợp các chỉ số toàn hệ thống""",
-
-    "services/user_service.dart": """MỤC ĐÍCH FILE:
-Lớp service để quản lý tài khoản và hồ sơ người dùng.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tạo và cập nhật hồ sơ người dùng
-- Quản lý vai trò và quyền hạn của người dùng
-- Truy xuất thông tin người dùng
-- Xử lý các thao tác tài khoản người dùng""",
-
-    "services/user_settings_service.dart": """MỤC ĐÍCH FILE:
-Quản lý tùy chọn người dùng và cài đặt ứng dụng.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Lưu và truy xuất cài đặt người dùng
-- Quản lý tùy chọn ngôn ngữ
-- Xử lý cài đặt thông báo
-- Lưu trữ các tùy chỉnh của người dùng""",
-
-    # Utils
-    "utils/equipment_identifiers.dart": """MỤC ĐÍCH FILE:
-Các hàm tiện ích để xử lý các thao tác mã định danh thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Xác thực định dạng mã định danh
-- Phân tích và định dạng ID
-- Các hàm tiện ích mã định danh""",
-
-    "utils/equipment_utils.dart": """MỤC ĐÍCH FILE:
-Các hàm tiện ích chung cho các thao tác liên quan đến thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Các thao tác thiết bị phổ biến
-- Các hàm helper để thao tác dữ liệu thiết bị
-- Các tiện ích định dạng cụ thể cho thiết bị""",
-
-    "utils/equipment_validation.dart": """MỤC ĐÍCH FILE:
-Logic xác thực cho dữ liệu thiết bị và form.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Xác thực dữ liệu đầu vào thiết bị
-- Kiểm tra các trường bắt buộc và định dạng
-- Cung cấp thông báo lỗi xác thực
-- Đảm bảo tính toàn vẹn dữ liệu""",
-
-    "utils/logger.dart": """MỤC ĐÍCH FILE:
-Tiện ích ghi log để gỡ lỗi và giám sát hành vi ứng dụng.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Cung cấp ghi log có cấu trúc
-- Ghi log lỗi, cảnh báo và thông tin
-- Hỗ trợ gỡ lỗi và khắc phục sự cố""",
-
-    "utils/serial_generator.dart": """MỤC ĐÍCH FILE:
-Tạo số serial duy nhất cho thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tạo số serial duy nhất
-- Đảm bảo tính duy nhất của số serial
-- Tuân theo định dạng số serial có thể cấu hình""",
-
-    # Widgets
-    "widgets/continuous_scan_popup.dart": """MỤC ĐÍCH FILE:
-Widget UI cho chức năng quét mã QR liên tục.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị máy quét QR trong dialog popup
-- Cho phép quét liên tục mà không cần đóng
-- Cung cấp phản hồi cho các lần quét thành công""",
-
-    "widgets/equipment_card.dart": """MỤC ĐÍCH FILE:
-Widget card có thể tái sử dụng để hiển thị thông tin thiết bị trong danh sách.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị tóm tắt thiết bị (tên, trạng thái, vị trí)
-- Cung cấp layout card nhất quán
-- Xử lý tương tác chạm để xem chi tiết thiết bị""",
-
-    "widgets/error_dialog.dart": """MỤC ĐÍCH FILE:
-Widget dialog có thể tái sử dụng để hiển thị thông báo lỗi.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị thông báo lỗi thân thiện với người dùng
-- Cung cấp UI lỗi nhất quán
-- Xử lý việc đóng lỗi""",
-
-    "widgets/grouped_borrow_request_card.dart": """MỤC ĐÍCH FILE:
-Hiển thị nhiều yêu cầu mượn được nhóm lại với nhau trong định dạng card.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị thông tin yêu cầu mượn được nhóm
-- Cung cấp chế độ xem có thể mở rộng/thu gọn
-- Xử lý các thao tác hàng loạt trên các yêu cầu được nhóm""",
-
-    "widgets/loading_indicator.dart": """MỤC ĐÍCH FILE:
-Widget chỉ báo tải có thể tái sử dụng cho các thao tác bất đồng bộ.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị spinner tải trong khi truy xuất dữ liệu
-- Cung cấp UI tải nhất quán
-- Thông báo tải có thể tùy chỉnh""",
-
-    "widgets/qr_scanner_widget.dart": """MỤC ĐÍCH FILE:
-Component widget máy quét mã QR cốt lõi.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Tích hợp camera để quét QR
-- Xử lý phát hiện và phân tích mã QR
-- Cung cấp callback kết quả quét""",
-
-    "widgets/qr_scan_return_dialog.dart": """MỤC ĐÍCH FILE:
-Widget dialog để trả thiết bị qua quét mã QR.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Kết hợp quét QR với quy trình trả
-- Xác thực thiết bị được quét để trả
-- Xác nhận các thao tác trả""",
-
-    # Screens - Admin
-    "screens/admin/admin_dashboard_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình dashboard chính cho quản trị viên hiển thị tổng quan hệ thống và các hành động nhanh.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị các chỉ số và thống kê dành riêng cho admin
-- Cung cấp điều hướng đến các tính năng admin
-- Hiển thị tình trạng hệ thống và cảnh báo""",
-
-    "screens/admin/analytics_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình phân tích và báo cáo hiển thị biểu đồ và thống kê.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị phân tích sử dụng và xu hướng
-- Hiển thị biểu đồ và đồ thị
-- Cung cấp chức năng xuất dữ liệu
-- Lọc dữ liệu theo khoảng thời gian""",
-
-    "screens/admin/audit_logs_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình để xem và tìm kiếm nhật ký kiểm toán hệ thống.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị danh sách theo thời gian các hành động hệ thống
-- Cung cấp chức năng tìm kiếm và lọc
-- Hiển thị thông tin kiểm toán chi tiết
-- Hỗ trợ xuất nhật ký kiểm toán""",
-
-    "screens/admin/category_management_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình để quản lý danh mục thiết bị (các thao tác CRUD).
-
-CÁC CHỨC NĂNG CHÍNH:
-- Liệt kê tất cả danh mục thiết bị
-- Tạo danh mục mới
-- Chỉnh sửa danh mục hiện có
-- Xóa danh mục không sử dụng""",
-
-    "screens/admin/user_management_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình để quản lý tài khoản người dùng và quyền hạn.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Liệt kê tất cả người dùng hệ thống
-- Tạo tài khoản người dùng mới
-- Chỉnh sửa vai trò và quyền hạn người dùng
-- Vô hiệu hóa/kích hoạt tài khoản người dùng""",
-
-    # Screens - Auth
-    "screens/auth/sign_in_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình xác thực người dùng để đăng nhập vào ứng dụng.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Cung cấp form đăng nhập bằng email/mật khẩu
-- Xử lý gửi xác thực
-- Hiển thị thông báo lỗi cho đăng nhập thất bại
-- Cung cấp liên kết đến đăng ký và đặt lại mật khẩu
-- Bao gồm tùy chọn truy cập khách""",
-
-    "screens/auth/sign_up_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình đăng ký người dùng để tạo tài khoản mới.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Cung cấp form đăng ký với các trường bắt buộc
-- Xác thực đầu vào người dùng
-- Tạo tài khoản người dùng mới
-- Xử lý lỗi đăng ký
-- Chuyển hướng đến đăng nhập sau khi đăng ký thành công""",
-
-    # Screens - Borrow
-    "screens/borrow/borrow_list_tab.dart": """MỤC ĐÍCH FILE:
-Tab hiển thị các yêu cầu mượn đang hoạt động trong màn hình quản lý mượn.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Liệt kê các yêu cầu mượn đang chờ và đã phê duyệt
-- Cung cấp tùy chọn lọc và sắp xếp
-- Hiển thị chi tiết và trạng thái yêu cầu
-- Cho phép các hành động phê duyệt/từ chối yêu cầu""",
-
-    "screens/borrow/borrow_management_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình chính để quản lý tất cả yêu cầu mượn với các tab cho các chế độ xem khác nhau.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Container cho các tab yêu cầu mượn
-- Cung cấp điều hướng giữa yêu cầu đang hoạt động và đã trả
-- Hiển thị thống kê tóm tắt
-- Cho phép các hành động hàng loạt trên yêu cầu""",
-
-    "screens/borrow/returned_requests_tab.dart": """MỤC ĐÍCH FILE:
-Tab hiển thị các yêu cầu mượn đã trả/hoàn thành.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Liệt kê các bản ghi mượn lịch sử
-- Cung cấp lọc theo ngày và người dùng
-- Hiển thị chi tiết và thời gian trả
-- Cho phép xem chi tiết yêu cầu đã hoàn thành""",
-
-    "screens/borrow/return_equipment_dialog.dart": """MỤC ĐÍCH FILE:
-Dialog để xử lý việc trả thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị form trả thiết bị
-- Xác thực điều kiện trả
-- Ghi lại thời gian và ghi chú trả
-- Cập nhật trạng thái thiết bị thành có sẵn""",
-
-    # Screens - Dashboard
-    "screens/dashboard/main_dashboard.dart": """MỤC ĐÍCH FILE:
-Màn hình dashboard chính với ngăn kéo điều hướng và các tùy chọn menu dựa trên vai trò.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Cung cấp cấu trúc điều hướng chính
-- Hiển thị các tùy chọn khác nhau dựa trên vai trò người dùng
-- Hiển thị các chỉ số và thống kê chính
-- Cho phép truy cập nhanh vào các chức năng phổ biến""",
-
-    # Screens - Equipment
-    "screens/equipment/equipment_catalog_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình hiển thị danh mục có thể tìm kiếm của tất cả thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Liệt kê tất cả thiết bị với tìm kiếm/lọc
-- Hiển thị trạng thái sẵn có của thiết bị
-- Cho phép quét mã QR để tra cứu nhanh
-- Cung cấp điều hướng đến chi tiết thiết bị
-- Cho phép tạo yêu cầu mượn""",
-
-    "screens/equipment/equipment_form_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình form để tạo và chỉnh sửa bản ghi thiết bị.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Cung cấp form nhập cho chi tiết thiết bị
-- Xác thực dữ liệu thiết bị
-- Tạo mã định danh thiết bị
-- Lưu thiết bị mới hoặc đã cập nhật
-- Tạo mã QR cho thiết bị""",
-
-    "screens/equipment/equipment_import_preview_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình xem trước để nhập hàng loạt thiết bị từ file Excel.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị dữ liệu Excel đã phân tích
-- Hiển thị lỗi và cảnh báo xác thực
-- Cho phép chỉnh sửa trước khi nhập
-- Thực hiện nhập hàng loạt vào database
-- Báo cáo thống kê nhập thành công/thất bại""",
-
-    # Screens - Settings
-    "screens/settings/settings_screen.dart": """MỤC ĐÍCH FILE:
-Màn hình cài đặt người dùng để quản lý tùy chọn và hồ sơ.
-
-CÁC CHỨC NĂNG CHÍNH:
-- Hiển thị thông tin hồ sơ người dùng
-- Cho phép lựa chọn ngôn ngữ
-- Quản lý tùy chọn thông báo
-- Cung cấp chức năng đăng xuất
-- Hiển thị phiên bản ứng dụng và thông tin về""",
+# Serialize a built document to .docx bytes, leaving the write to the caller (--pipeline)
+ENGINE_PACKAGE = {
+    'docx': word_document_bytes,
+    'fast': document_xml_package,
 }
 
-def create_word_document(file_path, file_key, explanation, output_dir):
-    """Create a Word document for a single Dart file"""
+# Output formats: every file is read, decoded and tokenized once into a FileContent, then
+# each renderer prepares what its locales share (such as the escaped code section) and
+# renders one document per locale from it
+FileContent = namedtuple('FileContent', ['file_key', 'file_path', 'explanations', 'outline',
+                                         'xref', 'code', 'source_hash', 'workbooks'])
+DEFAULT_FORMATS = ['docx']
+HTML_INDEX_FILENAME = 'index.html'
+HTML_HEAD = ('<!DOCTYPE html>\n<html lang="{lang}">\n<head>\n<meta charset="utf-8">\n'
+             '<title>{title}</title>\n<style>\n{style}</style>\n</head>\n<body>\n')
+HTML_TAIL = '</body>\n</html>\n'
+_MARKDOWN_SPECIAL = re.compile(r'([\\`*_\[\]<>#|])')
+_BACKTICK_RUN = re.compile('`+')
+
+def read_file_content(file_key, file_path, explanations, options, outline=None, xref=None,
+                      source=None, workbooks=None):
+    """Build the format-independent content of one file; source, when given, holds the
+    bytes already read and file_path is not opened again"""
+    if source is None:
+        with open(file_path, 'rb') as f:
+            source = f.read()
+    code = read_code_chunks(file_path, options, decode_source(source))
+    return FileContent(file_key, file_path, explanations, outline, xref, code, hash_bytes(source),
+                       workbooks)
+
+def chunk_text(chunk):
+    """Plain text of a code chunk, highlighted (a list of runs) or not"""
+    return chunk if isinstance(chunk, str) else ''.join(text for _, text in chunk)
+
+def prepare_docx(content, options):
+    return ENGINE_CODE[options.get('engine', 'docx')](content.code, options)
+
+def render_docx(content, code, locale, options):
+    """Build and package the .docx with the engine chosen by --engine"""
+    engine = options.get('engine', 'docx')
+    build = ENGINE_STAGES[engine][0]
+    document = build(content.file_path, content.file_key, content.explanations[locale], options,
+                     content.outline, locale, code, content.xref, content.source_hash,
+                     content.workbooks)
+    return ENGINE_PACKAGE[engine](document, options)
+
+def html_style():
+    """Stylesheet matching the fonts and colours of the Word documents"""
+    rules = [
+        f"body {{ font-family: '{DOCUMENT_FONT}', serif; max-width: 60em; margin: 2em auto; }}",
+        'h1 { color: #0000ff; }',
+        'h2 { color: #0064c8; }',
+        '.explanation { line-height: 1.5; white-space: pre-wrap; }',
+        f"pre {{ font-family: '{CODE_FONT}', monospace; margin: 0; }}",
+        'table { border-collapse: collapse; margin-bottom: 1em; }',
+        'th, td { border: 1px solid #999; padding: 0.1em 0.4em; text-align: left; }',
+    ]
+    for kind, (_, rgb, bold, italic) in HIGHLIGHT_STYLES.items():
+        rule = f'.{kind} {{ color: #{bytes(rgb).hex()};'
+        if bold:
+            rule += ' font-weight: bold;'
+        if italic:
+            rule += ' font-style: italic;'
+        rules.append(rule + ' }')
+    return ''.join(rule + '\n' for rule in rules)
+
+def prepare_html(content, options):
+    """Escape the code section once, one <pre> per chunk with a span per token class"""
+    from html import escape
+    parts = []
+    for chunk in content.code:
+        if isinstance(chunk, str):
+            body = escape(chunk, quote=False)
+        else:
+            body = ''.join(escape(text, quote=False) if kind is None else
+                           f'<span class="{kind}">{escape(text, quote=False)}</span>'
+                           for kind, text in chunk)
+        parts.append(f'<pre><code>{body}</code></pre>\n')
+    return ''.join(parts)
+
+def html_table(headers, rows):
+    from html import escape
+    cells = ''.join(f'<th>{escape(header, quote=False)}</th>' for header in headers)
+    parts = [f'<table>\n<tr>{cells}</tr>\n']
+    for row in rows:
+        cells = ''.join(f'<td>{escape(value, quote=False)}</td>' for value in row)
+        parts.append(f'<tr>{cells}</tr>\n')
+    parts.append('</table>\n')
+    return ''.join(parts)
+
+def render_html(content, code, locale, options):
+    """Render one file as a static HTML page; cross-references link the sibling pages"""
+    from html import escape
+    text = LOCALE_TEXT[locale]
+    title = f'File: {content.file_key}'
+    parts = [HTML_HEAD.format(lang=locale, title=escape(title), style=html_style()),
+             f'<h1>{escape(title)}</h1>\n',
+             f"<h2>{escape(text['explanation_heading'])}</h2>\n",
+             f'<p class="explanation">{escape(content.explanations[locale], quote=False)}</p>\n']
+    if content.outline:
+        outline = escape(outline_section_text(content.outline, locale), quote=False)
+        parts.append(f'<p class="explanation">{outline}</p>\n')
+    if content.xref is not None:
+        lines = []
+        for line, file_key in xref_lines(content.xref, locale):
+            if file_key is None:
+                lines.append(escape(line, quote=False))
+            else:
+                href = escape(output_filename_for(file_key, '.html'))
+                lines.append(f'- <a href="{href}">{escape(file_key, quote=False)}</a>')
+        parts.append('<p class="explanation">' + '\n'.join(lines) + '</p>\n')
+    if content.workbooks:
+        parts.append(f'<p class="explanation">{escape(text["workbook_heading"], quote=False)}</p>\n')
+        for summary in content.workbooks:
+            for caption, headers, rows in workbook_tables(summary, locale):
+                parts.append(f'<p class="explanation">{escape(caption, quote=False)}</p>\n')
+                parts.append(html_table(headers, rows))
+    parts.append(f"<h2>{escape(text['code_heading'])}</h2>\n")
+    parts.append(code)
+    parts.append(HTML_TAIL)
+    return ''.join(parts).encode('utf-8')
+
+def write_html_index(entries, output_dir, locales):
+    """Write index.html in every locale directory, linking the page of each entry"""
+    from html import escape
+    for locale in locales:
+        title = LOCALE_TEXT[locale]['toc_heading']
+        links = ''.join(f'<li><a href="{escape(output_filename_for(file_key, ".html"))}">'
+                        f'{escape(file_key, quote=False)}</a></li>\n'
+                        for file_key, explanations in entries if locale in explanations)
+        page = (HTML_HEAD.format(lang=locale, title=escape(title), style=html_style())
+                + f'<h1>{escape(title)}</h1>\n<ul>\n{links}</ul>\n' + HTML_TAIL)
+        write_if_changed(os.path.join(locale_output_dir(output_dir, locale), HTML_INDEX_FILENAME),
+                         page.encode('utf-8'))
+
+def markdown_escape(text):
+    return _MARKDOWN_SPECIAL.sub(r'\\\1', text)
+
+def markdown_text(text):
+    """Escape Markdown syntax and keep every line break of the plain text"""
+    return '  \n'.join(markdown_escape(line) for line in text.split('\n'))
+
+def markdown_table(headers, rows):
+    """A pipe table; line breaks inside a cell would end its row, so they become spaces"""
+    def line(cells):
+        return '| ' + ' | '.join(markdown_escape(' '.join(cell.split('\n'))) for cell in cells) + ' |\n'
+    return line(headers) + '|' + ' --- |' * len(headers) + '\n' + ''.join(line(row) for row in rows)
+
+def prepare_markdown(content, options):
+    """The code section as one fenced dart block, fenced longer than any backtick run in it"""
+    source = '\n'.join(chunk_text(chunk) for chunk in content.code)
+    fence = '`' * max([3] + [len(run) + 1 for run in _BACKTICK_RUN.findall(source)])
+    return f'{fence}dart\n{source}\n{fence}\n'
+
+def render_markdown(content, code, locale, options):
+    """Render one file as Markdown; cross-references link the sibling .md files"""
+    text = LOCALE_TEXT[locale]
+    parts = [f'# {markdown_text(f"File: {content.file_key}")}\n\n',
+             f"## {markdown_text(text['explanation_heading'])}\n\n",
+             markdown_text(content.explanations[locale]) + '\n\n']
+    if content.outline:
+        # The outline is already a nested bullet list below its heading line
+        heading, _, outline = outline_section_text(content.outline, locale).partition('\n')
+        parts.append(f"{markdown_text(heading)}\n\n{markdown_escape(outline)}\n\n")
+    if content.xref is not None:
+        for line, file_key in xref_lines(content.xref, locale):
+            if file_key is not None:
+                parts.append(f'- [{markdown_text(file_key)}]({output_filename_for(file_key, ".md")})\n')
+            elif line.startswith('- '):
+                parts.append(f'- {markdown_text(line[2:])}\n')
+            else:
+                # A blank line first, or the heading would continue the previous list item
+                parts.append(f'\n{markdown_text(line)}\n\n')
+        parts.append('\n')
+    if content.workbooks:
+        parts.append(markdown_text(text['workbook_heading']) + '\n\n')
+        for summary in content.workbooks:
+            for caption, headers, rows in workbook_tables(summary, locale):
+                parts.append(f'{markdown_text(caption)}\n\n{markdown_table(headers, rows)}\n')
+    parts.append(f"## {markdown_text(text['code_heading'])}\n\n")
+    parts.append(code)
+    return ''.join(parts).encode('utf-8')
+
+# Output format -> (file extension, per-file preparation shared by all locales, renderer)
+RENDERERS = {
+    'docx': ('.docx', prepare_docx, render_docx),
+    'html': ('.html', prepare_html, render_html),
+    'md': ('.md', prepare_markdown, render_markdown),
+}
+
+def render_documents(content, output_dir, options):
+    """Yield (output path, bytes) for every requested format and locale of one file"""
+    for output_format in options.get('formats', DEFAULT_FORMATS):
+        extension, prepare, render = RENDERERS[output_format]
+        with profile_stage('code'):
+            prepared = prepare(content, options)
+        for locale in content.explanations:
+            output_path = os.path.join(locale_output_dir(output_dir, locale),
+                                       output_filename_for(content.file_key, extension))
+            yield output_path, render(content, prepared, locale, options)
+
+# Combined handbook: every file in one document, streamed section by section
+COMBINED_FILENAME = 'lib_handbook.docx'
+PAGE_BREAK_XML = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+BOOKMARK_TITLE_XML = ('<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>'
+                      '<w:bookmarkStart w:id="{id}" w:name="{name}"/><w:r>{run}</w:r>'
+                      '<w:bookmarkEnd w:id="{id}"/></w:p>')
+TOC_BEGIN_XML = ('<w:p><w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+                 '<w:r><w:instrText xml:space="preserve"> TOC \\o "1-1" \\h \\z \\u </w:instrText></w:r>'
+                 '<w:r><w:fldChar w:fldCharType="separate"/></w:r></w:p>')
+TOC_ENTRY_XML = ('<w:p><w:hyperlink w:anchor="{name}" w:history="1">'
+                 '<w:r>{run}</w:r></w:hyperlink></w:p>')
+TOC_END_XML = '<w:p><w:r><w:fldChar w:fldCharType="end"/></w:r></w:p>'
+# Elements that follow w:updateFields in CT_Settings, in schema order
+_SETTINGS_AFTER_UPDATE_FIELDS = ('<w:hdrShapeDefaults', '<w:footnotePr', '<w:endnotePr',
+                                 '<w:compat', '<w:docVars', '<w:rsids', '<m:mathPr')
+
+def bookmark_name(index):
+    return f'file_{index:04d}'
+
+def enable_update_fields(settings_xml):
+    """Ask Word to refresh fields (the table of contents) when the document opens"""
+    for tag in _SETTINGS_AFTER_UPDATE_FIELDS:
+        position = settings_xml.find(tag)
+        if position != -1:
+            return settings_xml[:position] + '<w:updateFields w:val="true"/>' + settings_xml[position:]
+    return settings_xml.replace('</w:settings>', '<w:updateFields w:val="true"/></w:settings>')
+
+def iter_combined_xml(sections, options, style_ids, locale=DEFAULT_LOCALE):
+    """Yield the handbook body: table of contents, then one bookmarked section per file"""
+    yield paragraph_xml(LOCALE_TEXT[locale]['toc_heading'], style_ids['TOC Heading'])
+    yield TOC_BEGIN_XML
+    anchors = {}
+    for index, (file_key, *_) in enumerate(sections):
+        anchors[file_key] = bookmark_name(index)
+        yield TOC_ENTRY_XML.format(name=anchors[file_key], run=run_xml(f'File: {file_key}'))
+    yield TOC_END_XML
+    
+    for index, (file_key, file_path, explanations, outline, xref, workbooks) in enumerate(sections):
+        yield PAGE_BREAK_XML
+        title_xml = BOOKMARK_TITLE_XML.format(style_id=style_ids['Heading 1'], id=index,
+                                              name=anchors[file_key],
+                                              run=run_xml(f'File: {file_key}'))
+        yield from iter_body_xml(file_path, file_key, explanations[locale], options, outline,
+                                 style_ids, title_xml, locale, xref=xref, anchors=anchors,
+                                 workbooks=workbooks)
+
+def write_combined_document(sections, output_path, options, locale=DEFAULT_LOCALE):
+    """Write all sections into one .docx, streaming document.xml straight into the zip
+    so that only one file's content is held in memory at a time.
+    sections is a list of (file_key, file_path, {locale: explanation}, outline, xref, workbooks)."""
+    static_entries, document_head, document_tail, style_ids = fast_parts()
+    
+    # Stream into a temp file next to the target, then keep the old file if nothing changed
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(output_path) or '.')
     try:
-        # Read file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Create Word document
-        doc = Document()
-        
-        # File name
-        file_heading = doc.add_heading(f'File: {file_key}', level=1)
-        file_run = file_heading.runs[0]
-        file_run.font.name = 'Times New Roman'
-        file_run.font.size = Pt(13)
-        file_run.font.color.rgb = RGBColor(0, 0, 255)
-        
-        doc.add_paragraph()
+        with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w') as package:
+            for name, data in static_entries:
+                if name == 'word/settings.xml':
+                    data = enable_update_fields(data.decode('utf-8')).encode('utf-8')
+                elif name == 'docProps/core.xml':
+                    data = pin_core_properties(data, options)
+                write_entry(package, name, data, options)
+            
+            write_document_xml(package, itertools.chain(
+                [document_head], iter_combined_xml(sections, options, style_ids, locale),
+                [document_tail]), options)
+        replace_if_changed(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    return output_path
+
+def run_runs(element):
+    """(character style, text) of the runs under a paragraph or hyperlink element, with
+    neighbouring runs of one style merged, since engines may split text differently"""
+    runs = []
+    for run in element.iter(WORD_NAMESPACE + 'r'):
+        style = run.find(f'{WORD_NAMESPACE}rPr/{WORD_NAMESPACE}rStyle')
+        style = style.get(WORD_NAMESPACE + 'val') if style is not None else None
+        text = paragraph_text(run)
+        if runs and runs[-1][0] == style:
+            runs[-1] = (style, runs[-1][1] + text)
+        else:
+            runs.append((style, text))
+    return runs
+
+def document_body(path):
+    """Read back the body of a generated document as plain values that two engines can
+    be compared on: ('p', paragraph style, runs, bookmark names, hyperlinks) for each
+    paragraph and ('tbl', table style, header row flags, cell texts) for each table,
+    where runs are (character style, text) pairs and hyperlinks (anchor, runs) pairs"""
+    from xml.etree.ElementTree import fromstring
+    
+    def style_of(element, path):
+        style = element.find(path)
+        return style.get(WORD_NAMESPACE + 'val') if style is not None else None
+    
+    with zipfile.ZipFile(path) as package:
+        body = fromstring(package.read('word/document.xml')).find(WORD_NAMESPACE + 'body')
+    items = []
+    for element in body:
+        if element.tag == WORD_NAMESPACE + 'p':
+            items.append((
+                'p',
+                style_of(element, f'{WORD_NAMESPACE}pPr/{WORD_NAMESPACE}pStyle'),
+                run_runs(element),
+                [bookmark.get(WORD_NAMESPACE + 'name')
+                 for bookmark in element.iter(WORD_NAMESPACE + 'bookmarkStart')],
+                [(link.get(WORD_NAMESPACE + 'anchor'), run_runs(link))
+                 for link in element.iter(WORD_NAMESPACE + 'hyperlink')],
+            ))
+        elif element.tag == WORD_NAMESPACE + 'tbl':
+            rows = element.findall(WORD_NAMESPACE + 'tr')
+            items.append((
+                'tbl',
+                style_of(element, f'{WORD_NAMESPACE}tblPr/{WORD_NAMESPACE}tblStyle'),
+                [row.find(f'{WORD_NAMESPACE}trPr/{WORD_NAMESPACE}tblHeader') is not None
+                 for row in rows],
+                [[paragraph_text(cell) for cell in row.findall(WORD_NAMESPACE + 'tc')]
+                 for row in rows],
+            ))
+    return items
+
+def compare_engines(file_path, file_key, explanation, options, outline=None, locale=DEFAULT_LOCALE,
+                    xref=None, workbooks=None):
+    """Build one entry with every engine and return the names of those whose body
+    (see document_body) differs from docx"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bodies = {}
+        for name, engine in ENGINES.items():
+            engine_dir = os.path.join(tmp_dir, name)
+            os.mkdir(engine_dir)
+            bodies[name] = document_body(
+                engine(file_path, file_key, explanation, engine_dir, options, outline, locale,
+                       xref=xref, workbooks=workbooks))
+    return [name for name, result in bodies.items() if result != bodies['docx']]
+
+# Dart outline scanner: one linear pass of a small tokenizer, then a brace-aware
+# walk over the tokens that records declarations at top level and in type bodies
+OUTLINE_VERSION = 1
+OUTLINE_CACHE_FILENAME = '.outline_cache.json'
+
+_DART_TOKEN = re.compile(r"""
+    (?P<ws>[ \t\r\f\v]+)
+  | (?P<nl>\n)
+  | (?P<line_comment>//[^\n]*)
+  | (?P<block_comment>/\*)
+  | (?P<string>r?(?:'''|\"\"\"|'|"))
+  | (?P<ident>[A-Za-z_$][A-Za-z0-9_$]*)
+  | (?P<number>\d[\w.]*)
+  | (?P<arrow>=>)
+  | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+_BLOCK_COMMENT_MARK = re.compile(r'/\*|\*/')
+_STRING_PLAIN = re.compile(r'[^\\\n$\'"]+')
+
+DART_TYPE_KEYWORDS = {'class', 'mixin', 'enum', 'extension'}
+DART_TYPE_MODIFIERS = {'abstract', 'base', 'final', 'interface', 'sealed', 'mixin'}
+DART_DIRECTIVES = {'import', 'export', 'part', 'library', 'typedef'}
+
+def _scan_string_body(source, i, quote, raw, line):
+    """Advance through a string literal; stop after the closing quote or at '${'.
+    Returns (position, line, stopped_at_interpolation)."""
+    n = len(source)
+    while i < n:
+        plain = _STRING_PLAIN.match(source, i)
+        if plain:
+            i = plain.end()
+            continue
+        c = source[i]
+        if c == '\\' and not raw:
+            if source.startswith('\n', i + 1):
+                line += 1
+            i += 2
+        elif c == '\n':
+            line += 1
+            i += 1
+        elif source.startswith(quote, i):
+            return i + len(quote), line, False
+        elif c == '$' and not raw and source.startswith('${', i):
+            return i + 2, line, True
+        else:
+            i += 1
+    return i, line, False
+
+def tokenize_dart(source):
+    """Yield (kind, value, line) for identifiers, punctuation and string literals.
+    Comments and whitespace are dropped; a string with interpolation has value None."""
+    n = len(source)
+    i = 0
+    line = 1
+    # Open strings suspended inside '${ ... }': [quote, raw, brace depth, start line]
+    interpolations = []
+    while i < n:
+        m = _DART_TOKEN.match(source, i)
+        kind = m.lastgroup
+        value = m.group()
+        i = m.end()
+        if kind == 'ws' or kind == 'line_comment':
+            continue
+        if kind == 'nl':
+            line += 1
+            continue
+        if kind == 'block_comment':
+            depth = 1
+            for mark in _BLOCK_COMMENT_MARK.finditer(source, i):
+                depth += 1 if mark.group() == '/*' else -1
+                if depth == 0:
+                    break
+            end = mark.end() if depth == 0 else n
+            line += source.count('\n', i, end)
+            i = end
+            continue
+        if kind == 'string':
+            raw = value.startswith('r')
+            quote = value[1:] if raw else value
+            start_line = line
+            start = i
+            i, line, interpolated = _scan_string_body(source, i, quote, raw, line)
+            if interpolated:
+                interpolations.append([quote, raw, 0, start_line])
+            elif not interpolations:
+                yield ('string', source[start:i - len(quote)], start_line)
+            continue
+        if interpolations:
+            # Code inside an interpolation belongs to the enclosing string literal
+            current = interpolations[-1]
+            if value == '{':
+                current[2] += 1
+            elif value == '}':
+                if current[2] == 0:
+                    quote, raw, _, start_line = interpolations.pop()
+                    i, line, interpolated = _scan_string_body(source, i, quote, raw, line)
+                    if interpolated:
+                        interpolations.append([quote, raw, 0, start_line])
+                    elif not interpolations:
+                        yield ('string', None, start_line)
+                else:
+                    current[2] -= 1
+            continue
+        if kind == 'number':
+            continue
+        yield (kind, value, line)
+
+# Dart syntax highlighting: the same token pattern, but every character is kept and
+# classified, and neighbouring tokens of one class are merged into a single span
+DART_KEYWORDS = frozenset((
+    'abstract as assert async await base break case catch class const continue covariant '
+    'default deferred do dynamic else enum export extends extension external factory false '
+    'final finally for get hide if implements import in interface is late library mixin new '
+    'null on operator part required rethrow return sealed set show static super switch sync '
+    'this throw true try typedef var void when while with yield').split())
+DART_BUILTIN_TYPES = frozenset({'int', 'double', 'num', 'bool', 'Function'})
+
+def _identifier_class(name):
+    if name in DART_KEYWORDS:
+        return 'keyword'
+    if name in DART_BUILTIN_TYPES or name.lstrip('_$')[:1].isupper():
+        return 'type'
+    return None
+
+def _block_comment_end(source, i):
+    """Position just after the (possibly nested) block comment opened before i"""
+    depth = 1
+    for mark in _BLOCK_COMMENT_MARK.finditer(source, i):
+        depth += 1 if mark.group() == '/*' else -1
+        if depth == 0:
+            return mark.end()
+    return len(source)
+
+def highlight_dart(source):
+    """Yield (token class, start, end) spans that tile the whole source in one pass.
+    Whitespace joins the span before it, so a span only ends where the class changes;
+    a string with interpolations is one string span, '${...}' included."""
+    n = len(source)
+    i = 0
+    span_kind = None
+    span_start = 0
+    # True right after '@' or '@prefix.', where the next identifier is still annotation
+    in_annotation = False
+    # Open strings suspended inside '${ ... }': [quote, raw, brace depth]
+    interpolations = []
+    while i < n:
+        start = i
+        m = _DART_TOKEN.match(source, i)
+        kind = m.lastgroup
+        value = m.group()
+        i = m.end()
+        if kind == 'ws' or kind == 'nl':
+            continue
+        annotation = in_annotation
+        in_annotation = False
+        if kind == 'block_comment':
+            token_class = 'string' if interpolations else 'comment'
+            i = _block_comment_end(source, i)
+        elif kind == 'string':
+            token_class = 'string'
+            raw = value.startswith('r')
+            quote = value[1:] if raw else value
+            i, _, interpolated = _scan_string_body(source, i, quote, raw, 0)
+            if interpolated:
+                interpolations.append([quote, raw, 0])
+        elif interpolations:
+            # Code inside an interpolation is coloured with its enclosing string literal
+            token_class = 'string'
+            current = interpolations[-1]
+            if value == '{':
+                current[2] += 1
+            elif value == '}':
+                if current[2] == 0:
+                    quote, raw, _ = interpolations.pop()
+                    i, _, interpolated = _scan_string_body(source, i, quote, raw, 0)
+                    if interpolated:
+                        interpolations.append([quote, raw, 0])
+                else:
+                    current[2] -= 1
+        elif kind == 'line_comment':
+            token_class = 'comment'
+        elif kind == 'ident':
+            if annotation:
+                token_class = 'annotation'
+                in_annotation = source.startswith('.', i)
+            else:
+                token_class = _identifier_class(value)
+        elif value == '@' or (value == '.' and annotation):
+            token_class = 'annotation'
+            in_annotation = True
+        else:
+            token_class = None
+
+        if token_class != span_kind:
+            if start > span_start:
+                yield (span_kind, span_start, start)
+            span_kind = token_class
+            span_start = start
+    if n > span_start:
+        yield (span_kind, span_start, n)
+
+def iter_chunk_bounds(source, chunk_lines):
+    """Yield (start, end) of each code chunk, cut exactly as iter_code_chunks cuts lines"""
+    n = len(source)
+    start = 0
+    while start < n:
+        end = n
+        if chunk_lines:
+            end = start
+            for _ in range(chunk_lines):
+                end = source.find('\n', end)
+                if end == -1:
+                    end = n
+                    break
+                end += 1
+        yield start, end - 1 if source[end - 1] == '\n' else end
+        start = end
+
+def iter_highlighted_chunks(source, chunk_lines):
+    """Yield each code chunk as a list of (token class, text) runs, splitting the
+    spans that cross a chunk boundary"""
+    exhausted = (None, len(source), len(source))
+    spans = highlight_dart(source)
+    kind, span_start, span_end = next(spans, exhausted)
+    for start, end in iter_chunk_bounds(source, chunk_lines):
+        runs = []
+        while span_start < end:
+            if span_end > start:
+                runs.append((kind, source[max(span_start, start):min(span_end, end)]))
+                if span_end > end:
+                    break
+            kind, span_start, span_end = next(spans, exhausted)
+        yield runs
+
+def _strip_annotations(header):
+    """Drop leading '@Name', '@a.b' and '@Name(...)' annotations from a declaration header"""
+    i = 0
+    n = len(header)
+    while i < n and header[i][1] == '@':
+        i += 2
+        while i + 1 < n and header[i][1] == '.':
+            i += 2
+        if i < n and header[i][1] == '(':
+            depth = 0
+            while i < n:
+                if header[i][1] == '(':
+                    depth += 1
+                elif header[i][1] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        i += 1
+                        break
+                i += 1
+    return header[i:]
+
+def _classify_declaration(header, container):
+    """Turn the tokens before '{', ';' or '=>' into an outline item, or None for
+    fields, directives and anything else that is not listed"""
+    tokens = _strip_annotations(header)
+    if not tokens:
+        return None
+    values = [value for _, value, _ in tokens]
+    if values[0] in DART_DIRECTIVES:
+        return None
+    
+    # Type declarations: optional modifiers, then class/mixin/enum/extension
+    i = 0
+    while i < len(values) and values[i] in DART_TYPE_MODIFIERS and \
+            not (values[i] == 'mixin' and i + 1 < len(values) and values[i + 1] not in DART_TYPE_KEYWORDS):
+        i += 1
+    if i < len(values) and values[i] in DART_TYPE_KEYWORDS and i + 1 < len(values):
+        kind = values[i]
+        if kind == 'extension' and values[i + 1] == 'on':
+            name = 'on ' + values[i + 2] if i + 2 < len(values) else 'on ?'
+        else:
+            name = values[i + 1]
+        return {'kind': kind, 'name': name, 'line': tokens[i + 1][2], 'members': []}
+    
+    first_paren = values.index('(') if '(' in values else None
+    limit = first_paren if first_paren is not None else len(values)
+    
+    # Getters: '<type> get <name>' with no parameter list before the name
+    if 'get' in values[:limit]:
+        get_idx = values.index('get')
+        if get_idx + 1 < limit and tokens[get_idx + 1][0] == 'ident':
+            return {'kind': 'getter', 'name': values[get_idx + 1], 'line': tokens[get_idx + 1][2]}
+    
+    if first_paren is None or first_paren == 0:
+        return None
+    
+    if 'operator' in values[:first_paren]:
+        op_idx = values.index('operator')
+        name = 'operator ' + ''.join(values[op_idx + 1:first_paren])
+        return {'kind': 'method', 'name': name + '()', 'line': tokens[op_idx][2]}
+    
+    if '=' in values[:first_paren]:
+        return None
+    
+    name_idx = first_paren - 1
+    if values[name_idx] == '>':
+        # Generic method: step back over the type parameter list
+        depth = 0
+        while name_idx >= 0:
+            if values[name_idx] == '>':
+                depth += 1
+            elif values[name_idx] == '<':
+                depth -= 1
+                if depth == 0:
+                    break
+            name_idx -= 1
+        name_idx -= 1
+    if name_idx < 0 or tokens[name_idx][0] != 'ident' or values[name_idx] == 'Function':
+        return None
+    if name_idx > 0 and values[name_idx - 1] == 'set':
+        return None
+    
+    name = values[name_idx]
+    kind = 'method' if container is not None else 'function'
+    if name_idx >= 2 and values[name_idx - 1] == '.':
+        name = f'{values[name_idx - 2]}.{name}'
+        if container is not None and values[name_idx - 2] == container['name']:
+            kind = 'constructor'
+    elif container is not None and name == container['name']:
+        kind = 'constructor'
+    return {'kind': kind, 'name': name + '()', 'line': tokens[name_idx][2]}
+
+def parse_dart_outline(source):
+    """Return the outline of a Dart source as a list of declarations; types carry
+    their members. Every item is a dict with kind, name and line."""
+    outline = []
+    containers = []  # open class/mixin/enum/extension bodies
+    header = []
+    nesting = 0  # (), [] and {} opened inside the current header
+    skip_depth = 0  # > 0 while inside a function body or literal we do not outline
+    in_expression = False  # after '=>' until the terminating ';'
+    in_enum_values = False
+    
+    for token in tokenize_dart(source):
+        value = token[1]
         
-        # Explanation section
-        explanation_heading = doc.add_heading('GIẢI THÍCH FILE:', level=2)
-        explanation_run = explanation_heading.runs[0]
-        explanation_run.font.name = 'Times New Roman'
-        explanation_run.font.size = Pt(13)
-        explanation_run.font.color.rgb = RGBColor(0, 100, 200)
+        if skip_depth:
+            if value == '{':
+                skip_depth += 1
+            elif value == '}':
+                skip_depth -= 1
+            continue
         
-        explanation_para = doc.add_paragraph(explanation)
-        explanation_para.style.font.name = 'Times New Roman'
-        explanation_para.style.font.size = Pt(13)
-        explanation_para.paragraph_format.line_spacing = 1.15
-        for run in explanation_para.runs:
-            run.font.name = 'Times New Roman'
-            run.font.size = Pt(13)
+        if in_expression or in_enum_values:
+            if value in ('(', '[', '{'):
+                nesting += 1
+            elif value in (')', ']') or (value == '}' and nesting):
+                nesting -= 1
+            elif value == ';' and nesting == 0:
+                in_expression = in_enum_values = False
+            elif value == '}' and in_enum_values:
+                in_enum_values = False
+                containers.pop()
+            continue
         
-        doc.add_paragraph()
+        if nesting == 0 and value == '}':
+            header = []
+            if containers:
+                containers.pop()
+            continue
         
-        # Code section
-        code_heading = doc.add_heading('MÃ NGUỒN:', level=2)
-        code_run = code_heading.runs[0]
-        code_run.font.name = 'Times New Roman'
-        code_run.font.size = Pt(13)
-        code_run.font.color.rgb = RGBColor(0, 100, 200)
+        if nesting == 0 and value in ('{', ';', '=>'):
+            container = containers[-1] if containers else None
+            item = _classify_declaration(header, container)
+            header = []
+            if item is not None and 'members' in item:
+                (container['members'] if container else outline).append(item)
+                if value == '{':
+                    containers.append(item)
+                    in_enum_values = item['kind'] == 'enum'
+                continue
+            if item is not None:
+                (container['members'] if container else outline).append(item)
+            if value == '{':
+                skip_depth = 1
+            elif value == '=>':
+                in_expression = True
+            continue
         
-        code_para = doc.add_paragraph(content)
-        code_para.style.font.name = 'Times New Roman'
-        code_para.style.font.size = Pt(13)
-        code_para.paragraph_format.line_spacing = 1.15
-        for run in code_para.runs:
-            run.font.name = 'Times New Roman'
-            run.font.size = Pt(13)
+        if value in ('(', '[', '{'):
+            nesting += 1
+        elif value in (')', ']', '}'):
+            nesting -= 1
+        header.append(token)
+    
+    return outline
+
+def format_outline(outline, locale=DEFAULT_LOCALE):
+    """Render an outline as an indented bullet list with line numbers"""
+    text = LOCALE_TEXT[locale]
+    kinds = text['kinds']
+    lines = []
+    for item in outline:
+        lines.append(f"- {item['name']} ({kinds[item['kind']]}, {text['line']} {item['line']})")
+        for member in item.get('members', ()):
+            lines.append(f"    + {member['name']} ({kinds[member['kind']]}, {text['line']} {member['line']})")
+    return '\n'.join(lines)
+
+def outline_section_text(outline, locale=DEFAULT_LOCALE):
+    return LOCALE_TEXT[locale]['outline_heading'] + '\n' + format_outline(outline, locale)
+
+def outline_for(source, source_hash, cache):
+    """Return the outline of a source, parsing it only when its hash is not cached"""
+    outline = cache.get(source_hash)
+    if outline is None:
+        outline = parse_dart_outline(source.decode('utf-8', errors='replace'))
+        cache[source_hash] = outline
+    return outline
+
+def load_hash_cache(output_dir, filename, version, key):
+    """Load a {source hash: value} cache; a different version empties the cache"""
+    try:
+        with open(os.path.join(output_dir, filename), 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != version:
+        return {}
+    return cache.get(key, {})
+
+def write_text_atomic(path, text):
+    """Write through a uniquely named temp file, so concurrent runs sharing a directory
+    (shards) never collide and readers never see a half-written file"""
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        publish_temp_file(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_json_atomic(path, data, **dump_options):
+    write_text_atomic(path, json.dumps(data, sort_keys=True, **dump_options))
+
+def save_hash_cache(output_dir, filename, version, key, values):
+    write_json_atomic(os.path.join(output_dir, filename), {'version': version, key: values},
+                      ensure_ascii=False)
+
+def load_outline_cache(output_dir):
+    """Load outlines keyed by source hash; a different OUTLINE_VERSION empties the cache"""
+    return load_hash_cache(output_dir, OUTLINE_CACHE_FILENAME, OUTLINE_VERSION, 'outlines')
+
+def save_outline_cache(output_dir, outlines):
+    save_hash_cache(output_dir, OUTLINE_CACHE_FILENAME, OUTLINE_VERSION, 'outlines', outlines)
+
+# Import graph: the URIs of each file's import/export/part directives, cached by
+# source hash, resolved to lib-relative paths through a dict of the files in the tree
+IMPORTS_VERSION = 1
+IMPORT_CACHE_FILENAME = '.import_cache.json'
+DART_IMPORT_DIRECTIVES = {'import', 'export', 'part'}
+_PUBSPEC_NAME = re.compile(r'^name:\s*([A-Za-z_]\w*)', re.MULTILINE)
+
+def parse_dart_imports(source):
+    """Return the URIs of a Dart source's import, export and part directives, in order.
+    Directives precede every declaration, so scanning stops at the first '{'."""
+    uris = []
+    previous = None
+    expect_uri = False
+    for kind, value, _ in tokenize_dart(source):
+        if value == '{':
+            break
+        if expect_uri:
+            # 'part of' and interpolated strings (value None) are not file references
+            if kind == 'string' and value is not None:
+                uris.append(value)
+            expect_uri = False
+        elif kind == 'ident' and value in DART_IMPORT_DIRECTIVES and previous in (None, ';', ')'):
+            expect_uri = True
+        previous = value
+    return uris
+
+def read_package_name(lib_path):
+    """The package name from the pubspec.yaml next to lib/, used to resolve package: URIs"""
+    pubspec = os.path.join(os.path.dirname(os.path.abspath(lib_path)), 'pubspec.yaml')
+    try:
+        with open(pubspec, 'r', encoding='utf-8') as f:
+            match = _PUBSPEC_NAME.search(f.read())
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+def resolve_import(uri, file_key, package_name):
+    """Lib-relative path an import URI points at, or None for dart:, other packages
+    and paths outside lib/"""
+    if uri.startswith('package:'):
+        package, _, path = uri[len('package:'):].partition('/')
+        return path if package == package_name else None
+    if ':' in uri:
+        return None
+    path = posixpath.normpath(posixpath.join(posixpath.dirname(file_key), uri))
+    return None if path == '..' or path.startswith('../') else path
+
+def imports_for(source, source_hash, cache):
+    """Return the import URIs of a source, tokenizing it only when its hash is not cached"""
+    uris = cache.get(source_hash)
+    if uris is None:
+        uris = parse_dart_imports(source.decode('utf-8', errors='replace'))
+        cache[source_hash] = uris
+    return uris
+
+def build_import_graph(lib_path, file_keys, package_name, cache):
+    """Map each file to {'depends_on': [...], 'used_by': [...]} over the given files only.
+    One read per file, one dict lookup per import and one pass to invert the edges, so
+    the cost is linear in the total source size. cache maps source hash to import URIs;
+    the entries still in use are returned as the new cache."""
+    known = dict.fromkeys(file_keys)
+    depends_on = {}
+    used_by = {file_key: [] for file_key in known}
+    new_cache = {}
+    for file_key in known:
+        try:
+            with open(os.path.join(lib_path, file_key), 'rb') as f:
+                source = f.read()
+        except OSError:
+            continue
+        source_hash = hash_bytes(source)
+        if source_hash in cache:
+            new_cache[source_hash] = cache[source_hash]
+        targets = {}
+        for uri in imports_for(source, source_hash, new_cache):
+            target = resolve_import(uri, file_key, package_name)
+            if target in known and target != file_key:
+                targets[target] = None
+        depends_on[file_key] = targets
+    for file_key, targets in depends_on.items():
+        for target in targets:
+            used_by[target].append(file_key)
+    graph = {file_key: {'depends_on': sorted(depends_on.get(file_key, ())),
+                        'used_by': sorted(used_by[file_key])}
+             for file_key in known}
+    return graph, new_cache
+
+def project_import_graph(lib_path, output_dir, dry_run=False):
+    """Build the import graph of the whole project, whatever --include/--exclude select, so
+    a document's cross-references never depend on the filter. Reuses the on-disk cache and
+    refreshes it unless dry_run is set."""
+    file_keys = dict.fromkeys([*file_explanations, *discover_sources(lib_path, DEFAULT_INCLUDE, [])])
+    with profile_stage('xref'):
+        cache = load_hash_cache(output_dir, IMPORT_CACHE_FILENAME, IMPORTS_VERSION, 'imports')
+        graph, new_cache = build_import_graph(lib_path, file_keys, read_package_name(lib_path), cache)
+        if os.path.isdir(output_dir) and not dry_run:
+            save_hash_cache(output_dir, IMPORT_CACHE_FILENAME, IMPORTS_VERSION, 'imports', new_cache)
+    return graph
+
+def xref_lines(xref, locale=DEFAULT_LOCALE):
+    """Yield (text, linked file or None) for each line of the "depends on / used by" section"""
+    text = LOCALE_TEXT[locale]
+    for heading, file_keys in ((text['depends_on_heading'], xref['depends_on']),
+                               (text['used_by_heading'], xref['used_by'])):
+        yield heading, None
+        if not file_keys:
+            yield f"- {text['none']}", None
+        for file_key in file_keys:
+            yield f'- {file_key}', file_key
+
+def xref_section_text(xref, locale=DEFAULT_LOCALE):
+    return '\n'.join(line for line, _ in xref_lines(xref, locale))
+
+# Localization appendix: the ARB files joined by key into one table document, built
+# from the OOXML templates with every row rendered in one string (never Table.add_row)
+L10N_APPENDIX_FILENAME = 'l10n_appendix.docx'
+L10N_MANIFEST_FILENAME = '.l10n_manifest.json'
+L10N_APPENDIX_KEY = 'l10n_appendix'
+# Table columns after the key, each filled from one ARB file under lib/
+L10N_ARB_FILES = (('en', 'l10n/app_en.arb'), ('vi', 'l10n/app_vn.arb'))
+ARB_READ_SIZE = 64 * 1024
+_ARB_PLACEHOLDER = re.compile(r'\{(\w+)[,}]')
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+TABLE_XML_START = ('<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="5000" w:type="pct"/>'
+                   '</w:tblPr><w:tblGrid>{grid}</w:tblGrid>')
+TABLE_HEADER_ROW_XML = '<w:tr><w:trPr><w:tblHeader/></w:trPr>{cells}</w:tr>'
+TABLE_CELL_XML = '<w:tc><w:p><w:r>{run}</w:r></w:p></w:tc>'
+TABLE_FLAGGED_CELL_XML = ('<w:tc><w:tcPr><w:shd w:val="clear" w:color="auto" w:fill="FFE699"/>'
+                          '</w:tcPr><w:p><w:r>{run}</w:r></w:p></w:tc>')
+TABLE_XML_END = '</w:tbl>'
+
+def iter_arb_entries(path):
+    """Yield (key, value) pairs of a flat ARB object without loading the whole file;
+    at most one value plus a read block is held in memory at a time"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def parse_value():
+            nonlocal buffer, pos, eof
+            while True:
+                start = _JSON_WHITESPACE.match(buffer, pos).end()
+                try:
+                    value, end = decoder.raw_decode(buffer, start)
+                    # A number or literal at the end of the buffer may still be growing
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                chunk = f.read(ARB_READ_SIZE)
+                eof = not chunk
+                # Drop what is already parsed so the buffer stays bounded
+                buffer = buffer[pos:] + chunk
+                pos = 0
+
+        def next_char():
+            nonlocal buffer, pos, eof
+            while True:
+                pos = _JSON_WHITESPACE.match(buffer, pos).end()
+                if pos < len(buffer):
+                    pos += 1
+                    return buffer[pos - 1]
+                if eof:
+                    raise ValueError(f'{path}: unexpected end of ARB file')
+                chunk = f.read(ARB_READ_SIZE)
+                eof = not chunk
+                buffer = chunk
+                pos = 0
+
+        if next_char() != '{':
+            raise ValueError(f'{path}: an ARB file must hold one JSON object')
+        separator = next_char()
+        if separator == '}':
+            return
+        pos -= 1
+        while True:
+            key = parse_value()
+            if next_char() != ':':
+                raise ValueError(f'{path}: expected ":" after {key!r}')
+            yield key, parse_value()
+            separator = next_char()
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f'{path}: expected "," or "}}" after {key!r}')
+
+def join_arb_files(paths):
+    """Hash-join ARB files by message key in one pass over each file.
+    Returns ordered {key: {'values': [one per file, None if missing], 'placeholders': [...]}};
+    keys keep first-seen order, '@@' file attributes are skipped and '@key' metadata
+    contributes placeholders."""
+    rows = {}
+    metadata = {}
+    for index, path in enumerate(paths):
+        for key, value in iter_arb_entries(path):
+            if key.startswith('@@'):
+                continue
+            if key.startswith('@'):
+                metadata.setdefault(key[1:], {}).update(value if isinstance(value, dict) else {})
+                continue
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {'values': [None] * len(paths), 'placeholders': {}}
+            row['values'][index] = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+            if isinstance(value, str):
+                row['placeholders'].update(dict.fromkeys(_ARB_PLACEHOLDER.findall(value)))
+    for key, row in rows.items():
+        placeholders = metadata.get(key, {}).get('placeholders')
+        names = dict.fromkeys(placeholders if isinstance(placeholders, dict) else ())
+        names.update(row['placeholders'])
+        row['placeholders'] = list(names)
+    return rows
+
+def iter_l10n_appendix_xml(rows, style_ids, locale=DEFAULT_LOCALE):
+    """Yield the appendix body: title, a summary of missing translations, then the table
+    with one header row and one row per key, rendered as XML strings in bulk"""
+    text = LOCALE_TEXT[locale]
+    missing = [sum(1 for row in rows.values() if row['values'][i] is None)
+               for i in range(len(L10N_ARB_FILES))]
+    yield paragraph_xml(text['l10n_title'], style_ids['Heading 1'])
+    summary = text['l10n_summary'].format(total=len(rows))
+    for (arb_locale, _), count in zip(L10N_ARB_FILES, missing):
+        summary += '\n' + text['l10n_missing'].format(language=text['languages'][arb_locale],
+                                                      count=count)
+    yield paragraph_xml(summary, style_ids[EXPLANATION_STYLE])
+
+    columns = 2 + len(L10N_ARB_FILES)
+    yield TABLE_XML_START.format(grid='<w:gridCol/>' * columns)
+    headers = [text['l10n_key']] + [text['languages'][arb_locale] for arb_locale, _ in L10N_ARB_FILES]
+    headers.append(text['l10n_placeholders'])
+    yield TABLE_HEADER_ROW_XML.format(cells=''.join(TABLE_CELL_XML.format(run=run_xml(header))
+                                                    for header in headers))
+    flag = run_xml(text['l10n_missing_cell'])
+    for key, row in rows.items():
+        cells = [TABLE_CELL_XML.format(run=run_xml(key))]
+        for value in row['values']:
+            if value is None:
+                cells.append(TABLE_FLAGGED_CELL_XML.format(run=flag))
+            else:
+                cells.append(TABLE_CELL_XML.format(run=run_xml(value)))
+        cells.append(TABLE_CELL_XML.format(run=run_xml(', '.join(row['placeholders']))))
+        yield '<w:tr>' + ''.join(cells) + '</w:tr>'
+    yield TABLE_XML_END
+
+def run_l10n_appendix(lib_path, output_path, options, locales, force=False, dry_run=False):
+    """Rebuild the localization appendix in every locale directory when the ARB files or
+    the packaging options changed. Returns 'built', 'skipped', 'planned' or None when
+    the project has no ARB files."""
+    arb_paths = [os.path.join(lib_path, relative) for _, relative in L10N_ARB_FILES]
+    if not all(os.path.exists(path) for path in arb_paths):
+        return None
+    digest = hashlib.sha256()
+    for path in arb_paths:
+        with open(path, 'rb') as f:
+            digest.update(hash_bytes(f.read()).encode('ascii'))
+    fingerprint = {
+        'arb': digest.hexdigest(),
+        'locales': list(locales),
+        'options': {key: options.get(key) for key in ('reproducible', 'compress_level')},
+        'version': GENERATOR_VERSION,
+    }
+    manifest = {} if force else load_manifest(output_path, L10N_MANIFEST_FILENAME)
+    if is_up_to_date(manifest, L10N_APPENDIX_KEY, fingerprint, output_path):
+        return 'skipped'
+    if dry_run:
+        return 'planned'
+
+    require_docx()
+    if _profiler is not None:
+        _profiler.current_file = L10N_APPENDIX_FILENAME
+    with profile_stage('l10n'):
+        rows = join_arb_files(arb_paths)
+        _, document_head, document_tail, style_ids = fast_parts()
+        outputs = []
+        for locale in locales:
+            appendix_path = os.path.join(locale_output_dir(output_path, locale), L10N_APPENDIX_FILENAME)
+            document_xml = itertools.chain([document_head],
+                                           iter_l10n_appendix_xml(rows, style_ids, locale),
+                                           [document_tail])
+            save_document_xml(document_xml, appendix_path, options)
+            outputs.append(os.path.relpath(appendix_path, output_path))
+    save_manifest(output_path, {L10N_APPENDIX_KEY: {'fingerprint': fingerprint, 'outputs': outputs}},
+                  L10N_MANIFEST_FILENAME)
+    return 'built'
+
+def report_l10n_appendix(status):
+    messages = {
+        'built': f"✓ Đã tạo phụ lục đa ngôn ngữ: {L10N_APPENDIX_FILENAME}",
+        'skipped': f"↷ Phụ lục đa ngôn ngữ không thay đổi: {L10N_APPENDIX_FILENAME}",
+        'planned': f"→ Sẽ tạo lại phụ lục đa ngôn ngữ: {L10N_APPENDIX_FILENAME}",
+    }
+    if status in messages:
+        print(messages[status])
+
+# Sample import workbooks: the first sheet of each one streamed row by row straight from
+# its XML part into a column schema and a few sample rows, cached by workbook hash and
+# shown in the document of the service that imports them
+WORKBOOKS_VERSION = 1
+WORKBOOK_CACHE_FILENAME = '.workbook_cache.json'
+DEFAULT_WORKBOOK_ROWS = 5
+WORKBOOK_READ_SIZE = 1024 * 1024
+# Lib-relative source file -> workbooks, relative to the project root, shown in its document
+WORKBOOK_APPENDIX = {
+    'services/excel_import_service.dart': ('lab.xlsx', 'Book1.xlsx', 'Book2.xlsx'),
+}
+SHEET_NAMESPACE = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+PACKAGE_RELATIONSHIPS_NAMESPACE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+OFFICE_RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+# Built-in number formats that display a date or time, and the one for durations
+DATE_FORMAT_IDS = frozenset([*range(14, 23), 45, 46, 47])
+DURATION_FORMAT_ID = 46
+# Quoted text, escaped characters and [colour]/[condition] blocks, which are not date codes
+_NUMBER_FORMAT_LITERALS = re.compile(r'"[^"]*"|\\.|\[(?![hms]+\])[^\]]*\]', re.IGNORECASE)
+_CELL_COLUMN = re.compile(r'[A-Z]+')
+
+def column_letter(index):
+    """Spreadsheet name of a 0-based column index: A..Z, AA, AB..."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def column_index(letters):
+    """0-based index of a spreadsheet column name, the inverse of column_letter"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+def is_blank_cell(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def cell_text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'hour') and hasattr(value, 'day'):
+        return value.isoformat(' ')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def workbook_part_path(source_part, target):
+    """Zip name of a relationship target, which is relative to its source part's folder"""
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+def workbook_relationships(archive, part):
+    """{relationship id: (type, zip name)} of a workbook part; empty without a .rels"""
+    from xml.etree.ElementTree import fromstring
+    
+    folder, name = posixpath.split(part)
+    try:
+        rels = fromstring(archive.read(posixpath.join(folder, '_rels', name + '.rels')))
+    except KeyError:
+        return {}
+    return {rel.get('Id'): (rel.get('Type', ''), workbook_part_path(part, rel.get('Target', '')))
+            for rel in rels.iter(PACKAGE_RELATIONSHIPS_NAMESPACE + 'Relationship')}
+
+def number_format_kind(code):
+    """'datetime' or 'timedelta' for a custom number format that displays one, else None"""
+    section = _NUMBER_FORMAT_LITERALS.sub('', code).split(';')[0]
+    if re.match(r'\[[hms]+\]', section, re.IGNORECASE):
+        return 'timedelta'
+    return 'datetime' if re.search(r'[dmyhs]', section, re.IGNORECASE) else None
+
+def workbook_style_kinds(archive, styles_part):
+    """Per cell style index: 'datetime', 'timedelta' or None for plain numbers"""
+    from xml.etree.ElementTree import fromstring
+    
+    if styles_part is None:
+        return []
+    styles = fromstring(archive.read(styles_part))
+    custom = {int(number_format.get('numFmtId')): number_format_kind(number_format.get('formatCode', ''))
+              for number_format in styles.iter(SHEET_NAMESPACE + 'numFmt')}
+    kinds = []
+    cell_formats = styles.find(SHEET_NAMESPACE + 'cellXfs')
+    for cell_format in (cell_formats if cell_formats is not None else ()):
+        format_id = int(cell_format.get('numFmtId', 0))
+        if format_id in custom:
+            kinds.append(custom[format_id])
+        elif format_id in DATE_FORMAT_IDS:
+            kinds.append('timedelta' if format_id == DURATION_FORMAT_ID else 'datetime')
+        else:
+            kinds.append(None)
+    return kinds
+
+def read_shared_strings(archive, part):
+    """The shared string table, rich text runs joined and phonetic hints left out"""
+    from xml.etree.ElementTree import iterparse
+    
+    if part is None:
+        return []
+    item_tag = SHEET_NAMESPACE + 'si'
+    text_tag = SHEET_NAMESPACE + 't'
+    strings = []
+    with archive.open(part) as stream:
+        for _, element in iterparse(stream):
+            if element.tag == item_tag:
+                text = element.find(text_tag)
+                strings.append((text.text or '') if text is not None else ''.join(
+                    run.findtext(text_tag) or '' for run in element.iter(SHEET_NAMESPACE + 'r')))
+                element.clear()
+    return strings
+
+def excel_date(serial, date1904):
+    """Date, date and time, or time of day of an Excel serial number"""
+    import datetime
+    
+    day, fraction = divmod(serial, 1)
+    moment = datetime.timedelta(milliseconds=round(fraction * 86400000))
+    if 0 <= serial < 1 and moment.days == 0:
+        return (datetime.datetime.min + moment).time()
+    if date1904:
+        return datetime.datetime(1904, 1, 1) + datetime.timedelta(days=day) + moment
+    # The 1900 system counts a 29 February 1900 that never was
+    if 0 < serial < 60:
+        day += 1
+    return datetime.datetime(1899, 12, 30) + datetime.timedelta(days=day) + moment
+
+def cell_value(cell, shared_strings, style_kinds, date1904):
+    """Python value of a <c> element as its cached result shows it: str, int, float, bool,
+    datetime, time or timedelta, or None when empty"""
+    kind = cell.get('t', 'n')
+    if kind == 'inlineStr':
+        inline = cell.find(SHEET_NAMESPACE + 'is')
+        return None if inline is None else ''.join(
+            text.text or '' for text in inline.iter(SHEET_NAMESPACE + 't'))
+    value = cell.findtext(SHEET_NAMESPACE + 'v')
+    if not value:
+        # Also a formula that was never calculated
+        return None
+    if kind == 's':
+        return shared_strings[int(value)]
+    if kind == 'b':
+        return value.strip() in ('1', 'true')
+    if kind in ('str', 'e'):
+        return value
+    if kind == 'd':
+        import datetime
         
-        # Save document
-        output_filename = file_key.replace('/', '_').replace('\\', '_').replace('.dart', '.docx')
-        output_path = os.path.join(output_dir, output_filename)
-        doc.save(output_path)
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    number = float(value) if any(char in value for char in '.eE') else int(value)
+    style = int(cell.get('s', 0))
+    style_kind = style_kinds[style] if style < len(style_kinds) else None
+    if style_kind == 'timedelta':
+        import datetime
         
-        print(f"✓ Đã tạo: {output_filename}")
-        return True
+        return datetime.timedelta(days=number)
+    if style_kind == 'datetime':
+        return excel_date(number, date1904)
+    return number
+
+def iter_sheet_rows(path):
+    """Yield the title of a workbook's first worksheet, then each of its rows as a list of
+    cell values, None for empty cells. The sheet XML is parsed as it is unzipped and every
+    row is dropped from the tree once read, so memory is the shared strings plus one row,
+    whatever the sheet's length."""
+    from xml.etree.ElementTree import fromstring, iterparse
+    
+    with zipfile.ZipFile(path) as archive:
+        root_rels = workbook_relationships(archive, '')
+        workbook_part = next((target for kind, target in root_rels.values()
+                              if kind.endswith('/officeDocument')), 'xl/workbook.xml')
+        workbook = fromstring(archive.read(workbook_part))
+        rels = workbook_relationships(archive, workbook_part)
+        parts = {kind.rsplit('/', 1)[-1]: target for kind, target in rels.values()}
+        properties = workbook.find(SHEET_NAMESPACE + 'workbookPr')
+        date1904 = properties is not None and properties.get('date1904', '') in ('1', 'true')
+        # The first sheet that is a worksheet, not a chart sheet
+        for sheet in workbook.iter(SHEET_NAMESPACE + 'sheet'):
+            kind, sheet_part = rels.get(sheet.get(OFFICE_RELATIONSHIP_ID), ('', None))
+            if kind.endswith('/worksheet'):
+                break
+        else:
+            raise KeyError('no worksheet')
+        shared_strings = read_shared_strings(archive, parts.get('sharedStrings'))
+        style_kinds = workbook_style_kinds(archive, parts.get('styles'))
+        yield sheet.get('name', '')
         
-    except Exception as e:
-        print(f"✗ Lỗi khi xử lý {file_key}: {str(e)}")
+        sheet_data_tag = SHEET_NAMESPACE + 'sheetData'
+        row_tag = SHEET_NAMESPACE + 'row'
+        cell_tag = SHEET_NAMESPACE + 'c'
+        sheet_data = None
+        with archive.open(sheet_part) as stream:
+            for event, element in iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == sheet_data_tag:
+                        sheet_data = element
+                    continue
+                if element.tag != row_tag:
+                    continue
+                row = []
+                for cell in element.iter(cell_tag):
+                    match = _CELL_COLUMN.match(cell.get('r', ''))
+                    index = column_index(match.group()) if match else len(row)
+                    row.extend([None] * (index + 1 - len(row)))
+                    row[index] = cell_value(cell, shared_strings, style_kinds, date1904)
+                element.clear()
+                if sheet_data is not None:
+                    sheet_data.remove(element)
+                yield row
+
+def summarize_workbook(path, sample_rows):
+    """Stream the first sheet of a workbook into {'name', 'sheet', 'rows', 'columns',
+    'sample'}. The first non-empty row holds the headers and empty rows are skipped.
+    Only per-column counters and the first sample_rows data rows are kept, so memory
+    does not grow with the number of rows (see iter_sheet_rows)."""
+    rows = iter_sheet_rows(path)
+    title = next(rows)
+    headers = None
+    row_count = 0
+    filled = []  # per column: non-empty cells
+    types = []   # per column: {cell type name: count}
+    sample = []
+    for row in rows:
+        if all(is_blank_cell(value) for value in row):
+            continue
+        if headers is None:
+            headers = [' '.join(cell_text(value).split()) for value in row]
+            continue
+        row_count += 1
+        while len(filled) < len(row):
+            filled.append(0)
+            types.append({})
+        for index, value in enumerate(row):
+            if not is_blank_cell(value):
+                filled[index] += 1
+                kind = type(value).__name__
+                types[index][kind] = types[index].get(kind, 0) + 1
+        if len(sample) < sample_rows:
+            sample.append([cell_text(value) for value in row])
+    
+    headers = headers or []
+    width = max(len(headers), len(filled))
+    # Trailing columns with neither a header nor a value are only formatting
+    while width and not (width <= len(headers) and headers[width - 1]) and not (
+            width <= len(filled) and filled[width - 1]):
+        width -= 1
+    columns = []
+    for index in range(width):
+        counts = types[index] if index < len(types) else {}
+        columns.append({
+            'letter': column_letter(index),
+            'header': headers[index] if index < len(headers) else '',
+            # Most frequent type first
+            'types': sorted(counts, key=lambda kind: (-counts[kind], kind)),
+            'nulls': row_count - (filled[index] if index < len(filled) else 0),
+        })
+    sample = [(row + [''] * width)[:width] for row in sample]
+    return {'name': os.path.basename(path), 'sheet': title, 'rows': row_count,
+            'columns': columns, 'sample': sample}
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(WORKBOOK_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def project_workbooks(lib_path, file_keys, output_dir, sample_rows=DEFAULT_WORKBOOK_ROWS,
+                      dry_run=False):
+    """Map each selected file that has sample workbooks to their summaries, streaming only
+    the workbooks whose hash is not in the on-disk cache, which is refreshed unless
+    dry_run is set"""
+    root = os.path.dirname(os.path.abspath(lib_path))
+    selected = set(file_keys)
+    wanted = {}
+    for file_key, names in WORKBOOK_APPENDIX.items():
+        paths = [os.path.join(root, name) for name in names]
+        paths = [path for path in paths if os.path.exists(path)]
+        if file_key in selected and paths:
+            wanted[file_key] = paths
+    if not wanted:
+        return {}
+    
+    with profile_stage('workbooks'):
+        cache = load_hash_cache(output_dir, WORKBOOK_CACHE_FILENAME, WORKBOOKS_VERSION, 'workbooks')
+        new_cache = {}
+        summaries = {}
+        for file_key, paths in wanted.items():
+            summaries[file_key] = []
+            for path in paths:
+                # The same workbook with another --workbook-rows is another summary
+                key = f'{hash_file(path)}:{sample_rows}'
+                summary = cache.get(key)
+                if summary is None:
+                    try:
+                        summary = summarize_workbook(path, sample_rows)
+                    except Exception as e:
+                        print(f"⚠ Không đọc được {os.path.basename(path)}: {str(e) or type(e).__name__}")
+                        continue
+                new_cache[key] = summary
+                summaries[file_key].append(summary)
+        if os.path.isdir(output_dir) and not dry_run:
+            save_hash_cache(output_dir, WORKBOOK_CACHE_FILENAME, WORKBOOKS_VERSION, 'workbooks',
+                            new_cache)
+    return summaries
+
+def workbook_tables(summary, locale=DEFAULT_LOCALE):
+    """Yield (caption, table headers, table rows) for a workbook's schema, then its sample"""
+    text = LOCALE_TEXT[locale]
+    columns = summary['columns']
+    yield (text['workbook_schema'].format(name=summary['name'], sheet=summary['sheet'],
+                                          rows=summary['rows'], columns=len(columns)),
+           [text['workbook_column'], text['workbook_header'], text['workbook_type'],
+            text['workbook_nulls']],
+           [[column['letter'], column['header'],
+             ', '.join(text['cell_types'].get(kind, kind) for kind in column['types'])
+             or text['none'], str(column['nulls'])]
+            for column in columns])
+    yield (text['workbook_sample'].format(count=len(summary['sample'])),
+           [column['header'] or column['letter'] for column in columns],
+           summary['sample'])
+
+def add_workbook_section(doc, workbooks, locale=DEFAULT_LOCALE):
+    """python-docx version of iter_workbook_xml; the tables are a handful of rows each"""
+    from docx.oxml import OxmlElement
+    
+    doc.add_paragraph(LOCALE_TEXT[locale]['workbook_heading'], style=EXPLANATION_STYLE)
+    for summary in workbooks:
+        for caption, headers, rows in workbook_tables(summary, locale):
+            doc.add_paragraph(caption, style=EXPLANATION_STYLE)
+            table = doc.add_table(rows=1, cols=len(headers), style='Table Grid')
+            # Repeat the header row on every page, as TABLE_HEADER_ROW_XML does
+            table.rows[0]._tr.get_or_add_trPr().append(OxmlElement('w:tblHeader'))
+            for cell, header in zip(table.rows[0].cells, headers):
+                cell.text = header
+            for row in rows:
+                for cell, value in zip(table.add_row().cells, row):
+                    cell.text = value
+
+def iter_table_xml(headers, rows):
+    yield TABLE_XML_START.format(grid='<w:gridCol/>' * len(headers))
+    yield TABLE_HEADER_ROW_XML.format(cells=''.join(TABLE_CELL_XML.format(run=run_xml(header))
+                                                    for header in headers))
+    for row in rows:
+        yield '<w:tr>' + ''.join(TABLE_CELL_XML.format(run=run_xml(value)) for value in row) + '</w:tr>'
+    yield TABLE_XML_END
+
+def iter_workbook_xml(workbooks, style_ids, locale=DEFAULT_LOCALE):
+    """Yield the sample workbook section: a heading line, then per workbook a caption and
+    table for the column schema and for the sample rows"""
+    yield paragraph_xml(LOCALE_TEXT[locale]['workbook_heading'], style_ids[EXPLANATION_STYLE])
+    for summary in workbooks:
+        for caption, headers, rows in workbook_tables(summary, locale):
+            yield paragraph_xml(caption, style_ids[EXPLANATION_STYLE])
+            yield from iter_table_xml(headers, rows)
+
+def output_filename_for(file_key, extension='.docx'):
+    """Map a lib-relative Dart path to its output file name"""
+    return file_key.replace('/', '_').replace('\\', '_').replace('.dart', extension)
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def entry_fingerprint(source, explanations, options, xref=None, workbooks=None):
+    """Hash every input that affects the generated documents for one entry; xref covers
+    the other files whose imports decide this entry's cross-reference section and
+    workbooks the sample workbooks summarized in it"""
+    explanation_text = json.dumps(explanations, ensure_ascii=False, sort_keys=True)
+    fingerprint = {
+        'source': hash_bytes(source),
+        'explanation': hash_bytes(explanation_text.encode('utf-8')),
+        'options': options,
+        'version': GENERATOR_VERSION,
+    }
+    if xref is not None:
+        fingerprint['xref'] = hash_bytes(json.dumps(xref, sort_keys=True).encode('utf-8'))
+    if workbooks:
+        fingerprint['workbooks'] = hash_bytes(json.dumps(workbooks, sort_keys=True).encode('utf-8'))
+    return fingerprint
+
+def load_manifest(output_dir, filename=MANIFEST_FILENAME):
+    """Load the manifest stored next to the outputs, or an empty one"""
+    manifest_path = os.path.join(output_dir, filename)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest.get('entries', {})
+
+def save_manifest(output_dir, entries, filename=MANIFEST_FILENAME, summary=None):
+    """Atomically write the manifest so an interrupted run never leaves it half written;
+    summary holds a shard's result counts for --merge-shards"""
+    manifest = {'version': GENERATOR_VERSION, 'entries': entries}
+    if summary is not None:
+        manifest['summary'] = summary
+    write_json_atomic(os.path.join(output_dir, filename), manifest, ensure_ascii=False, indent=2)
+
+def is_up_to_date(manifest, file_key, fingerprint, output_dir):
+    """An entry is fresh when its inputs match the manifest and all its outputs still exist"""
+    recorded = manifest.get(file_key)
+    if recorded is None or recorded.get('fingerprint') != fingerprint:
         return False
-
-def main():
-    lib_path = r"c:\Users\PC\Documents\DATN\medical\flutter_application_1\lib"
-    output_path = r"c:\Users\PC\Documents\DATN\medical\flutter_application_1\lib_documentation"
+    outputs = recorded.get('outputs')
+    return bool(outputs) and all(os.path.exists(os.path.join(output_dir, output)) for output in outputs)
+
+# Build journal: one JSON line per finished entry, appended as results arrive, so an
+# interrupted run resumes after the last finished file; once a run completes only the
+# failures are kept, for --retry-failed
+def journal_filename(manifest_filename):
+    return os.path.splitext(manifest_filename)[0] + '.journal.jsonl'
+
+def load_journal(output_dir, filename):
+    """Return the last record per file key, ignoring a line torn by a crash"""
+    records = {}
+    try:
+        f = open(os.path.join(output_dir, filename), 'r', encoding='utf-8')
+    except OSError:
+        return records
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['file_key']] = record
+    return records
+
+def journal_line(record):
+    return json.dumps(record, ensure_ascii=False, sort_keys=True) + '\n'
+
+def save_journal(output_dir, filename, records):
+    """Replace the journal with the given records, removing it when there are none"""
+    path = os.path.join(output_dir, filename)
+    if records:
+        write_text_atomic(path, ''.join(journal_line(record) for record in records.values()))
+    elif os.path.exists(path):
+        os.remove(path)
+
+def load_discovery_cache(cache_path, lib_path):
+    """Load the per-directory listing cache, discarding it if it belongs to another tree"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('root') != os.path.abspath(lib_path):
+        return {}
+    return cache.get('dirs', {})
+
+def save_discovery_cache(cache_path, lib_path, dirs):
+    write_json_atomic(cache_path, {'root': os.path.abspath(lib_path), 'dirs': dirs})
+
+def scan_directory(path):
+    """List the files and subdirectories of one directory with a single os.scandir pass"""
+    files = []
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    return sorted(files), sorted(subdirs)
+
+def walk_sources(lib_path, cached_dirs):
+    """Walk lib_path, re-listing only directories whose mtime changed since the cache.
+    Returns the lib-relative file paths and the refreshed per-directory cache."""
+    fresh_dirs = {}
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        abs_dir = os.path.join(lib_path, rel_dir) if rel_dir else lib_path
+        mtime = os.stat(abs_dir).st_mtime_ns
+        cached = cached_dirs.get(rel_dir)
+        if cached is not None and cached['mtime'] == mtime:
+            files, subdirs = cached['files'], cached['subdirs']
+        else:
+            files, subdirs = scan_directory(abs_dir)
+        fresh_dirs[rel_dir] = {'mtime': mtime, 'files': files, 'subdirs': subdirs}
+        pending.extend(f'{rel_dir}/{name}' if rel_dir else name for name in reversed(subdirs))
     
-    # Create output directory
-    os.makedirs(output_path, exist_ok=True)
+    paths = []
+    for rel_dir, listing in fresh_dirs.items():
+        paths.extend(f'{rel_dir}/{name}' if rel_dir else name for name in listing['files'])
+    return paths, fresh_dirs
+
+def matches_any(path, patterns):
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns)
+
+def discover_sources(lib_path, include, exclude, cache_path=None):
+    """Return the sorted lib-relative paths of source files selected by the globs"""
+    cached_dirs = load_discovery_cache(cache_path, lib_path) if cache_path else {}
+    paths, fresh_dirs = walk_sources(lib_path, cached_dirs)
+    if cache_path and fresh_dirs != cached_dirs:
+        save_discovery_cache(cache_path, lib_path, fresh_dirs)
+    return sorted(path for path in paths
+                  if matches_any(path, include) and not matches_any(path, exclude))
+
+def load_explanation_tables(locales):
+    """Explanation tables for the requested locales; the default one is already loaded"""
+    return {locale: file_explanations if locale == DEFAULT_LOCALE else load_explanations(locale)
+            for locale in locales}
+
+def explanations_for(file_key, tables):
+    """{locale: explanation} for one file, using the locale's fallback text where missing"""
+    return {locale: table.get(file_key, LOCALE_TEXT[locale]['fallback'])
+            for locale, table in tables.items()}
+
+def collect_entries(discovered, include, exclude, tables):
+    """Pair sources with per-locale explanations: file_explanations order first, then new
+    files. Explained files go through the same globs as discovered ones, and are kept
+    even when missing so that they are reported."""
+    entries = [(file_key, explanations_for(file_key, tables)) for file_key in file_explanations
+               if matches_any(file_key, include) and not matches_any(file_key, exclude)]
+    entries.extend((file_key, explanations_for(file_key, tables))
+                   for file_key in discovered if file_key not in file_explanations)
+    return entries
+
+def locale_output_dir(output_dir, locale):
+    return output_dir if locale == DEFAULT_LOCALE else os.path.join(output_dir, locale)
+
+def build_entry(task):
+    """Build one entry in every requested format and locale; safe to run in a worker
+    process. The source is read and tokenized once, then shared by every document."""
+    file_key, explanations, lib_path, output_dir, options, outline, xref, workbooks = task
+    file_path = os.path.join(lib_path, file_key)
+    start = time.perf_counter()
     
-    print("=" * 60)
-    print("Bắt đầu tạo tài liệu Word...")
-    print("=" * 60)
-    print()
+    if not os.path.exists(file_path):
+        return BuildResult(file_key, STATUS_MISSING, None, 0.0, None)
+    
+    if _profiler is not None:
+        _profiler.current_file = file_key
+    try:
+        content = read_file_content(file_key, file_path, explanations, options, outline, xref,
+                                    workbooks=workbooks)
+        output_paths = []
+        for output_path, data in render_documents(content, output_dir, options):
+            with profile_stage('save'):
+                write_if_changed(output_path, data)
+            output_paths.append(os.path.relpath(output_path, output_dir))
+        result = BuildResult(file_key, STATUS_OK, output_paths, time.perf_counter() - start, None)
+    except Exception as e:
+        result = BuildResult(file_key, STATUS_FAILED, None, time.perf_counter() - start,
+                             str(e) or type(e).__name__, over_budget=isinstance(e, MemoryError))
+    if _profiler is not None:
+        result = result._replace(stages=_profiler.take(file_key))
+    return result
+
+def report_result(result):
+    """Print the per-file status line for a build result"""
+    if result.status == STATUS_OK:
+        print(f"✓ Đã tạo: {', '.join(result.output_paths)} ({result.elapsed:.2f}s)")
+    elif result.status == STATUS_MISSING:
+        print(f"⚠ Không tìm thấy file: {result.file_key}")
+    else:
+        print(f"✗ Lỗi khi xử lý {result.file_key}: {result.error}")
+
+def run_builds(tasks, jobs):
+    """Build all tasks, serially or across a process pool, and yield results as they finish"""
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield build_entry(task)
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor, as_completed
     
+    # Workers profile their own stages and hand them back inside each BuildResult
+    initializer = initargs = None
+    if _profiler is not None:
+        initializer, initargs = enable_profiling, (_profiler.track_memory,)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer,
+                             initargs=initargs or ()) as executor:
+        futures = [executor.submit(build_entry, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+# Sent by an isolated child once it is set up, before it starts on its entry
+ISOLATED_READY = 'ready'
+
+def run_isolated(tasks, jobs, timeout=None, memory_mb=None):
+    """Build each task in its own child process, at most jobs at a time. A child running
+    past timeout seconds is killed and memory_mb caps its address space, so a hang, a
+    crash or a MemoryError fails only that entry. Yields results as they finish."""
+    import multiprocessing
+    from multiprocessing.connection import wait
+    
+    profile = _profiler.track_memory if _profiler is not None else None
+    # Forked children inherit python-docx and the base document built here; where only
+    # spawn exists each child loads them itself, and its clock starts once it reports
+    # ISOLATED_READY
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    if tasks:
+        fast_parts()
+    pending = iter(tasks)
+    running = {}  # result pipe -> (process, file_key, start time)
+    try:
+        while True:
+            while len(running) < max(jobs, 1):
+                task = next(pending, None)
+                if task is None:
+                    break
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_isolated_build,
+                                          args=(task, memory_mb, sender, profile), daemon=True)
+                process.start()
+                sender.close()
+                running[receiver] = (process, task[0], time.perf_counter())
+            if not running:
+                return
+            
+            wait_time = None
+            if timeout:
+                oldest = min(start for _, _, start in running.values())
+                wait_time = max(oldest + timeout - time.perf_counter(), 0)
+            ready = wait(list(running), wait_time)
+            now = time.perf_counter()
+            for receiver, (process, file_key, start) in list(running.items()):
+                if receiver in ready:
+                    try:
+                        result = receiver.recv()
+                    except EOFError:
+                        result = None
+                    if result == ISOLATED_READY:
+                        running[receiver] = (process, file_key, now)
+                        continue
+                    process.join()
+                    if result is None:
+                        result = BuildResult(file_key, STATUS_FAILED, None, now - start,
+                                             f"tiến trình con dừng bất thường (mã thoát {process.exitcode})",
+                                             over_budget=True)
+                elif timeout and now - start >= timeout:
+                    process.kill()
+                    process.join()
+                    result = BuildResult(file_key, STATUS_FAILED, None, now - start,
+                                         f"quá thời gian cho phép ({timeout:g}s)", over_budget=True)
+                else:
+                    continue
+                receiver.close()
+                del running[receiver]
+                yield result
+    finally:
+        for receiver, (process, *_) in running.items():
+            process.kill()
+            process.join()
+            receiver.close()
+
+def _isolated_build(task, memory_mb, connection, profile):
+    if profile is not None and _profiler is None:
+        enable_profiling(profile)
+    if memory_mb:
+        limit_memory(memory_mb)
+    fast_parts()
+    connection.send(ISOLATED_READY)
+    connection.send(build_entry(task))
+    connection.close()
+
+def limit_memory(memory_mb):
+    """Cap this process's address space; a no-op where the resource module is missing"""
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def render_entry(task, source):
+    """Pipeline builder stage: turn source bytes already read by the reader stage into
+    serialized documents, one per format and locale, without touching the disk.
+    Returns (BuildResult, [(output path, document bytes)])."""
+    file_key, explanations, lib_path, output_dir, options, outline, xref, workbooks = task
+    file_path = os.path.join(lib_path, file_key)
+    if source is None:
+        return BuildResult(file_key, STATUS_MISSING, None, 0.0, None), []
+    
+    start = time.perf_counter()
+    if _profiler is not None:
+        _profiler.current_file = file_key
+    try:
+        content = read_file_content(file_key, file_path, explanations, options, outline, xref,
+                                    source, workbooks)
+        files = list(render_documents(content, output_dir, options))
+        output_paths = [os.path.relpath(path, output_dir) for path, _ in files]
+        result = BuildResult(file_key, STATUS_OK, output_paths, time.perf_counter() - start, None)
+    except Exception as e:
+        result = BuildResult(file_key, STATUS_FAILED, None, time.perf_counter() - start,
+                             str(e) or type(e).__name__)
+        files = []
+    if _profiler is not None:
+        result = result._replace(stages=_profiler.take(file_key))
+    return result, files
+
+def _pipeline_stage(work, inbox, outbox):
+    """Run one pipeline stage in a thread: feed each inbox item to work, then pass the end
+    marker (or the exception that stopped this or an earlier stage) downstream"""
+    import threading
+    
+    def run():
+        try:
+            while True:
+                item = inbox.get()
+                if item is PIPELINE_END or isinstance(item, BaseException):
+                    outbox.put(item)
+                    return
+                work(item)
+        except BaseException as e:
+            outbox.put(e)
+    
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def run_pipeline(planned, jobs, depth):
+    """Overlap the three halves of a build: a reader thread consumes planned (reading and
+    fingerprinting sources), a builder renders documents in memory (in a process pool
+    when jobs > 1) and a writer thread saves them. Queues hold at most depth items, so
+    no more than about depth built-but-unsaved documents exist at once. Yields results
+    in plan order."""
+    import queue
+    import threading
+    from concurrent.futures import Future, ProcessPoolExecutor
+    
+    read_queue = queue.Queue(depth)
+    write_queue = queue.Queue(depth)
+    result_queue = queue.Queue()
+    executor = None
+    if jobs > 1:
+        initializer = initargs = None
+        if _profiler is not None:
+            initializer, initargs = enable_profiling, (_profiler.track_memory,)
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=initializer,
+                                       initargs=initargs or ())
+    
+    def read():
+        try:
+            for item in planned:
+                read_queue.put(item)
+            read_queue.put(PIPELINE_END)
+        except BaseException as e:
+            read_queue.put(e)
+    
+    def build(item):
+        if executor is not None:
+            future = executor.submit(render_entry, *item)
+        else:
+            future = Future()
+            future.set_result(render_entry(*item))
+        # Blocks while depth documents are already waiting for the writer
+        write_queue.put(future)
+    
+    def write(future):
+        result, files = future.result()
+        start = time.perf_counter()
+        try:
+            with profile_stage('write', result.file_key):
+                for output_path, data in files:
+                    write_if_changed(output_path, data)
+        except OSError as e:
+            result = result._replace(status=STATUS_FAILED, output_paths=None, error=str(e))
+        result_queue.put(result._replace(elapsed=result.elapsed + time.perf_counter() - start))
+    
+    threading.Thread(target=read, daemon=True).start()
+    _pipeline_stage(build, read_queue, write_queue)
+    _pipeline_stage(write, write_queue, result_queue)
+    try:
+        while True:
+            item = result_queue.get()
+            if item is PIPELINE_END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def run_build(entries, lib_path, output_path, options, jobs=1, force=False, prune=True,
+              dry_run=False, pipeline_depth=0, xrefs=None, manifest_filename=MANIFEST_FILENAME,
+              budget=None, retry_failed=False, workbooks=None):
+    """Rebuild every entry whose inputs changed, then update the manifest and outline cache.
+    With prune=False, records of entries not passed in are kept (partial rebuilds); with
+    dry_run=True the stale entries are only listed and nothing is written. A positive
+    pipeline_depth overlaps reading, building and writing (see run_pipeline). xrefs maps
+    file keys to their import cross-references when options['xref'] is on, and workbooks
+    to the summaries of their sample workbooks (see project_workbooks). A shard passes
+    its partial manifest_filename and starts from the full manifest when it has none yet.
+    budget, a (timeout seconds, memory MB) pair, builds every entry in an isolated child
+    process (see run_isolated). Results are journaled as they arrive: an interrupted run
+    resumes after the last finished entry. An entry that ran out of its budget (timed
+    out, hit the memory cap or crashed its child) is not retried with the same inputs
+    and budget unless retry_failed is set, which rebuilds only the failed entries; any
+    other failure is retried on the next run.
+    Returns (success_count, skipped_count, fail_count)."""
     success_count = 0
     fail_count = 0
+    skipped = []
+    known_failures = {}
     
-    for file_key, explanation in file_explanations.items():
-        file_path = os.path.join(lib_path, file_key)
-        
-        if os.path.exists(file_path):
-            if create_word_document(file_path, file_key, explanation, output_path):
+    # force rebuilds the entries passed in; the records of the others stay usable
+    journal_name = journal_filename(manifest_filename)
+    journal = load_journal(output_path, journal_name)
+    manifest = load_manifest(output_path, manifest_filename) or load_manifest(output_path)
+    for file_key, record in journal.items():
+        if record['status'] == STATUS_OK:
+            manifest[file_key] = {'fingerprint': record['fingerprint'], 'outputs': record['outputs']}
+    failed = {file_key: record for file_key, record in journal.items()
+              if record['status'] == STATUS_FAILED}
+    # Only over-budget failures are skipped, and only under the same time/memory limits
+    budget_record = list(budget) if budget else None
+    if retry_failed:
+        entries = [entry for entry in entries if entry[0] in failed]
+        prune = False
+    new_manifest = {} if prune else dict(manifest)
+    fingerprints = {}
+    outline_cache = load_outline_cache(output_path) if options['outline'] else {}
+    new_outline_cache = {} if prune else dict(outline_cache)
+    # Sources that exist but could not be read fail on their own, without a build
+    read_failures = []
+    
+    def plan():
+        """Read and fingerprint each entry, yielding (task, source bytes) for the stale ones"""
+        for file_key, explanations in entries:
+            file_path = os.path.join(lib_path, file_key)
+            outline = None
+            source = None
+            xref = xrefs.get(file_key) if xrefs is not None else None
+            file_workbooks = (workbooks or {}).get(file_key)
+            if os.path.exists(file_path):
+                try:
+                    with profile_stage('read', file_key):
+                        with open(file_path, 'rb') as f:
+                            source = f.read()
+                except OSError as e:
+                    read_failures.append(BuildResult(file_key, STATUS_FAILED, None, 0.0,
+                                                     str(e) or type(e).__name__))
+                    continue
+                fingerprint = entry_fingerprint(source, explanations, options, xref, file_workbooks)
+                source_hash = fingerprint['source']
+                if options['outline'] and source_hash in outline_cache:
+                    new_outline_cache[source_hash] = outline_cache[source_hash]
+                if not force and is_up_to_date(manifest, file_key, fingerprint, output_path):
+                    new_manifest[file_key] = manifest[file_key]
+                    skipped.append(file_key)
+                    continue
+                previous = failed.get(file_key)
+                if (not (force or retry_failed) and previous is not None
+                        and previous.get('over_budget')
+                        and previous['fingerprint'] == fingerprint
+                        and previous.get('budget') == budget_record):
+                    known_failures[file_key] = previous
+                    continue
+                fingerprints[file_key] = fingerprint
+                if options['outline'] and not dry_run:
+                    with profile_stage('outline', file_key):
+                        outline = outline_for(source, source_hash, new_outline_cache)
+            yield ((file_key, explanations, lib_path, output_path, options, outline, xref,
+                    file_workbooks), source)
+    
+    if pipeline_depth > 0 and not dry_run:
+        # The plan is consumed by the reader stage, so python-docx is checked up front
+        require_docx()
+        results = run_pipeline(plan(), jobs, pipeline_depth)
+    else:
+        tasks = [task for task, _ in plan()]
+        results = None
+    
+    def report_known_failures():
+        for file_key, record in known_failures.items():
+            print(f"✗ Bỏ qua {file_key}, lần trước đã lỗi: {record['error']} "
+                  "(dùng --retry-failed để thử lại)")
+    
+    if dry_run:
+        report_known_failures()
+        for file_key, *_ in tasks:
+            if file_key in fingerprints:
+                print(f"→ Sẽ tạo: {file_key}")
+            else:
+                print(f"⚠ Không tìm thấy file: {file_key}")
+        for result in read_failures:
+            report_result(result)
+        return (len(fingerprints), len(skipped),
+                len(tasks) - len(fingerprints) + len(known_failures) + len(read_failures))
+    
+    if results is None:
+        # Only now, with something to build, does python-docx have to be present
+        if tasks:
+            require_docx()
+        results = run_isolated(tasks, jobs, *budget) if budget else run_builds(tasks, jobs)
+    failures = {}
+    with open(os.path.join(output_path, journal_name), 'a', encoding='utf-8') as journal_file:
+        # read_failures is complete once results, which may read the plan lazily, is done
+        for result in itertools.chain(results, read_failures):
+            report_result(result)
+            if _profiler is not None:
+                _profiler.merge(result.file_key, result.stages)
+            record = {'file_key': result.file_key, 'status': result.status,
+                      'fingerprint': fingerprints.get(result.file_key),
+                      'outputs': result.output_paths, 'error': result.error,
+                      'budget': budget_record,
+                      'over_budget': bool(budget and result.over_budget)}
+            if result.status == STATUS_OK:
                 success_count += 1
+                new_manifest[result.file_key] = {
+                    'fingerprint': fingerprints[result.file_key],
+                    'outputs': result.output_paths,
+                }
             else:
                 fail_count += 1
-        else:
-            print(f"⚠ Không tìm thấy file: {file_key}")
-            fail_count += 1
+                new_manifest.pop(result.file_key, None)
+                if result.status != STATUS_FAILED:
+                    continue
+                failures[result.file_key] = record
+            journal_file.write(journal_line(record))
+            journal_file.flush()
+    # Only now has the plan been consumed: the pipeline reads it lazily
+    report_known_failures()
+    fail_count += len(known_failures)
+    failures.update(known_failures)
+    if not prune:
+        # Failures of entries outside this run stay recorded when nothing is pruned
+        failures.update((file_key, record) for file_key, record in failed.items()
+                        if file_key not in fingerprints and file_key not in failures)
     
+    save_manifest(output_path, new_manifest, manifest_filename)
+    save_journal(output_path, journal_name, failures)
+    if options['outline']:
+        save_outline_cache(output_path, new_outline_cache)
+    return success_count, len(skipped), fail_count
+
+def print_summary(success_count, skipped_count, fail_count, output_path, elapsed, dry_run=False):
     print()
     print("=" * 60)
-    print(f"✓ Đã tạo thành công: {success_count} tài liệu")
+    if dry_run:
+        print(f"→ Sẽ tạo: {success_count} tài liệu (chạy thử, không ghi file)")
+    else:
+        print(f"✓ Đã tạo thành công: {success_count} tài liệu")
+    if skipped_count > 0:
+        print(f"↷ Không thay đổi: {skipped_count} tài liệu")
     if fail_count > 0:
         print(f"✗ Thất bại: {fail_count} tài liệu")
     print(f"📁 Vị trí lưu: {output_path}")
+    print(f"⏱ Thời gian: {elapsed:.2f}s")
+    print("=" * 60)
+
+# Sharding: the entries split across N independent runs, balanced by source size, each
+# recording its results in a partial manifest that --merge-shards combines into one tree
+SHARD_MANIFEST_PATTERN = re.compile(r'\.manifest\.shard-(\d+)-of-(\d+)\.json$')
+
+def shard_manifest_filename(index, count):
+    return f'.manifest.shard-{index}-of-{count}.json'
+
+def parse_shard(value):
+    index, _, count = value.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"phân đoạn phải có dạng I/N, ví dụ 2/4: {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"phân đoạn ngoài khoảng 1..{count}: {value!r}")
+    return index, count
+
+def assign_shards(sizes, count):
+    """Map each file key to a shard in 1..count, largest files first, each to the least
+    loaded shard (ties go to the lower index). Only sizes and keys decide the split, so
+    every node computes the same one from the same checkout."""
+    import heapq
+    
+    loads = [(0, index) for index in range(1, count + 1)]
+    assignment = {}
+    for file_key, size in sorted(sizes.items(), key=lambda item: (-item[1], item[0])):
+        load, index = heapq.heappop(loads)
+        assignment[file_key] = index
+        heapq.heappush(loads, (load + size, index))
+    return assignment
+
+def shard_entries(entries, lib_path, index, count):
+    """The entries of shard index out of count, in their original order, and the source
+    bytes they cover out of the total"""
+    sizes = {}
+    for file_key, _ in entries:
+        try:
+            sizes[file_key] = os.path.getsize(os.path.join(lib_path, file_key))
+        except OSError:
+            sizes[file_key] = 0
+    assignment = assign_shards(sizes, count)
+    selected = [entry for entry in entries if assignment[entry[0]] == index]
+    return selected, sum(sizes[file_key] for file_key, _ in selected), sum(sizes.values())
+
+def find_shard_manifests(shard_dirs):
+    """Return {shard index: (directory, partial manifest)} and the shard count"""
+    shards = {}
+    counts = set()
+    for shard_dir in shard_dirs:
+        try:
+            filenames = sorted(os.listdir(shard_dir))
+        except OSError as e:
+            sys.exit(f"✗ Không đọc được thư mục phân đoạn {shard_dir}: {e}")
+        for filename in filenames:
+            match = SHARD_MANIFEST_PATTERN.match(filename)
+            if match is None:
+                continue
+            index, count = int(match.group(1)), int(match.group(2))
+            with open(os.path.join(shard_dir, filename), 'r', encoding='utf-8') as f:
+                shards[index] = (shard_dir, json.load(f))
+            counts.add(count)
+    if len(counts) != 1:
+        sys.exit("✗ Không tìm thấy manifest phân đoạn, hoặc các phân đoạn có số N khác nhau: "
+                 f"{sorted(counts)}")
+    count = counts.pop()
+    missing = [str(index) for index in range(1, count + 1) if index not in shards]
+    if missing:
+        sys.exit(f"✗ Thiếu phân đoạn {', '.join(missing)} trên tổng {count}")
+    return shards, count
+
+def merge_shards(shard_dirs, output_path):
+    """Copy every shard's outputs into output_path and combine the partial manifests into
+    its manifest. Returns (success, skipped, failed, elapsed) summed over the shards, the
+    elapsed time being the slowest shard's, as the shards ran side by side."""
+    shards, count = find_shard_manifests(shard_dirs)
+    entries = {}
+    totals = [0, 0, 0]
+    elapsed = 0.0
+    for index in sorted(shards):
+        shard_dir, manifest = shards[index]
+        summary = manifest.get('summary', {})
+        for position, key in enumerate(('success', 'skipped', 'failed')):
+            totals[position] += summary.get(key, 0)
+        elapsed = max(elapsed, summary.get('elapsed', 0.0))
+        for file_key, record in manifest.get('entries', {}).items():
+            for output in record['outputs']:
+                source_path = os.path.join(shard_dir, output)
+                target_path = os.path.join(output_path, output)
+                if os.path.abspath(source_path) != os.path.abspath(target_path):
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    with open(source_path, 'rb') as f:
+                        write_if_changed(target_path, f.read())
+            entries[file_key] = record
+    save_manifest(output_path, entries)
+    print(f"✓ Đã gộp {count} phân đoạn: {len(entries)} mục trong manifest")
+    return totals[0], totals[1], totals[2], elapsed
+
+# Staleness check: read the code section back out of each existing document and compare
+# it with the current source, without python-docx and without building anything
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+CHECK_SKIP_FILENAMES = {COMBINED_FILENAME, L10N_APPENDIX_FILENAME}
+
+def paragraph_text(paragraph):
+    """Text of a w:p element, with tabs and breaks mapped back the way run_xml wrote them"""
+    parts = []
+    for element in paragraph.iter():
+        tag = element.tag
+        if tag == WORD_NAMESPACE + 't':
+            parts.append(element.text or '')
+        elif tag == WORD_NAMESPACE + 'tab':
+            parts.append('\t')
+        elif tag == WORD_NAMESPACE + 'br' or tag == WORD_NAMESPACE + 'cr':
+            parts.append('\n')
+    return ''.join(parts)
+
+def read_document_source(path):
+    """Stream word/document.xml of a .docx up to its code section. Returns
+    (source bookmark name, None) as soon as the code heading carries a source
+    bookmark; otherwise (None, text of every paragraph after the code heading, one line
+    per paragraph), or (None, None) without a code section. Each paragraph is cleared
+    once read, so memory does not grow with the document."""
+    from xml.etree.ElementTree import iterparse
+    
+    code_headings = {text['code_heading'] for text in LOCALE_TEXT.values()}
+    paragraph_tag = WORD_NAMESPACE + 'p'
+    bookmark_tag = WORD_NAMESPACE + 'bookmarkStart'
+    name_attribute = WORD_NAMESPACE + 'name'
+    lines = None
+    with zipfile.ZipFile(path) as package, package.open('word/document.xml') as stream:
+        for _, element in iterparse(stream):
+            if element.tag != paragraph_tag:
+                continue
+            if lines is not None:
+                lines.append(paragraph_text(element))
+            elif paragraph_text(element) in code_headings:
+                for bookmark in element.iter(bookmark_tag):
+                    name = bookmark.get(name_attribute, '')
+                    if name.startswith(SOURCE_BOOKMARK_PREFIX):
+                        return name, None
+                lines = []
+            element.clear()
+    return None, None if lines is None else '\n'.join(lines)
+
+def check_document(document_path, file_path):
+    """Return why a document is out of date with its source, or None if it is current"""
+    if not os.path.exists(file_path):
+        return 'source_missing'
+    if not os.path.exists(document_path):
+        return 'document_missing'
+    try:
+        bookmark, text = read_document_source(document_path)
+    except (OSError, KeyError, zipfile.BadZipFile, SyntaxError):
+        return 'unreadable'
+    with open(file_path, 'rb') as f:
+        source = f.read()
+    if bookmark is not None:
+        return None if bookmark == source_bookmark_name(hash_bytes(source)) else 'code_changed'
+    # Documents from before the source bookmark: compare the code text itself. The first
+    # generator kept the file's final newline in the code paragraph, later ones drop it.
+    if text is None:
+        return 'no_code'
+    source_text = decode_source(source)
+    return None if text in (strip_line_end(source_text), source_text) else 'code_changed'
+
+CHECK_REASONS = {
+    'source_missing': 'không còn file nguồn',
+    'document_missing': 'chưa có tài liệu',
+    'unreadable': 'không đọc được tài liệu',
+    'no_code': 'tài liệu không có phần mã nguồn',
+    'code_changed': 'mã nguồn đã thay đổi',
+    'orphan': 'tài liệu không ứng với file nguồn nào',
+}
+
+def run_check(entries, lib_path, output_path, locales, sources=None):
+    """Compare every expected document with its source and list stray documents, those
+    of no file in sources (every file under lib/; by default the entries themselves),
+    so that a run narrowed by --include/--exclude does not count the rest as strays.
+    Returns the exit status: 0 when everything is current, 1 on any drift."""
+    known = {output_filename_for(file_key)
+             for file_key in (sources if sources is not None else (key for key, _ in entries))}
+    start = time.perf_counter()
+    stale = []
+    checked = 0
+    for locale in locales:
+        locale_dir = locale_output_dir(output_path, locale)
+        expected = set()
+        for file_key, explanations in entries:
+            if locale not in explanations:
+                continue
+            filename = output_filename_for(file_key)
+            expected.add(filename)
+            checked += 1
+            reason = check_document(os.path.join(locale_dir, filename),
+                                    os.path.join(lib_path, file_key))
+            if reason is not None:
+                stale.append((os.path.join(locale_dir, filename), reason))
+        if os.path.isdir(locale_dir):
+            for filename in sorted(os.listdir(locale_dir)):
+                if (filename.endswith('.docx') and filename not in expected
+                        and filename not in known and filename not in CHECK_SKIP_FILENAMES):
+                    stale.append((os.path.join(locale_dir, filename), 'orphan'))
+    
+    for path, reason in stale:
+        print(f"✗ Lỗi thời: {os.path.relpath(path, output_path)} ({CHECK_REASONS[reason]})")
+    elapsed = time.perf_counter() - start
+    if stale:
+        print(f"✗ {len(stale)} tài liệu lỗi thời, đã kiểm tra {checked} tài liệu "
+              f"trong {elapsed:.2f}s — chạy lại generate_word_docs.py để cập nhật")
+        return 1
+    print(f"✓ {checked} tài liệu khớp với mã nguồn ({elapsed:.2f}s)")
+    return 0
+
+def source_snapshot(lib_path, include, exclude):
+    """Map every selected source to (mtime_ns, size) for change polling"""
+    snapshot = {}
+    for file_key in discover_sources(lib_path, include, exclude):
+        try:
+            stat = os.stat(os.path.join(lib_path, file_key))
+        except OSError:
+            continue
+        snapshot[file_key] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+def watch_sources(lib_path, output_path, options, tables, include, exclude, interval=0.5,
+                  debounce=0.3, xrefs=None, workbooks=None):
+    """Poll the source tree and rebuild only the files that changed, until interrupted;
+    with cross-references on, files whose "used by / depends on" lists changed as well.
+    Runs in this process so imports, the styled base and the fast-engine parts stay loaded."""
+    snapshot = source_snapshot(lib_path, include, exclude)
+    # Warm the styled base before the first change arrives
+    fast_parts()
+    print(f"👀 Đang theo dõi {len(snapshot)} file trong {lib_path} (Ctrl+C để dừng)")
+    
+    try:
+        while True:
+            time.sleep(interval)
+            current = source_snapshot(lib_path, include, exclude)
+            if current == snapshot:
+                continue
+            # Debounce: wait until a burst of saves settles before rebuilding
+            while True:
+                time.sleep(debounce)
+                settled = source_snapshot(lib_path, include, exclude)
+                if settled == current:
+                    break
+                current = settled
+            
+            changed = [file_key for file_key, stamp in current.items() if snapshot.get(file_key) != stamp]
+            snapshot = current
+            if not changed:
+                continue
+            
+            start = time.perf_counter()
+            if xrefs is not None:
+                new_xrefs = project_import_graph(lib_path, output_path)
+                changed.extend(file_key for file_key, xref in new_xrefs.items()
+                               if file_key in current and file_key not in changed
+                               and xrefs.get(file_key) != xref)
+                xrefs = new_xrefs
+            entries = [(file_key, explanations_for(file_key, tables)) for file_key in changed]
+            success_count, _, fail_count = run_build(entries, lib_path, output_path, options,
+                                                     prune=False, xrefs=xrefs,
+                                                     workbooks=workbooks)
+            elapsed = time.perf_counter() - start
+            print(f"↻ {time.strftime('%H:%M:%S')} cập nhật {success_count} tài liệu"
+                  + (f", {fail_count} lỗi" if fail_count else '') + f" ({elapsed * 1000:.0f}ms)")
+    except KeyboardInterrupt:
+        print()
+        print("Đã dừng theo dõi.")
+    return 0
+
+def run_engine_comparison(lib_path, entries, options, xrefs=None, workbooks=None):
+    """Check that every engine produces the same paragraphs as python-docx; return an exit code"""
+    mismatch_count = 0
+    for file_key, explanations in entries:
+        file_path = os.path.join(lib_path, file_key)
+        if not os.path.exists(file_path):
+            continue
+        outline = None
+        if options['outline']:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                outline = parse_dart_outline(f.read())
+        for locale, explanation in explanations.items():
+            mismatched = compare_engines(file_path, file_key, explanation, options, outline, locale,
+                                         xrefs.get(file_key) if xrefs is not None else None,
+                                         (workbooks or {}).get(file_key))
+            if mismatched:
+                mismatch_count += 1
+                print(f"✗ Khác biệt ({', '.join(mismatched)}): {file_key} [{locale}]")
+    
+    if mismatch_count > 0:
+        print(f"✗ {mismatch_count} file cho kết quả khác nhau giữa các engine")
+        return 1
+    print("✓ Mọi engine cho kết quả giống nhau")
+    return 0
+
+def run_combined_build(entries, lib_path, output_path, options, xrefs=None, workbooks=None):
+    """Write every entry into a single handbook document and print the usual summary"""
+    start = time.perf_counter()
+    outline_cache = load_outline_cache(output_path) if options['outline'] else {}
+    new_outline_cache = {}
+    sections = []
+    missing_count = 0
+    
+    for file_key, explanations in entries:
+        file_path = os.path.join(lib_path, file_key)
+        if not os.path.exists(file_path):
+            print(f"⚠ Không tìm thấy file: {file_key}")
+            missing_count += 1
+            continue
+        outline = None
+        if options['outline']:
+            with open(file_path, 'rb') as f:
+                source = f.read()
+            source_hash = hash_bytes(source)
+            if source_hash in outline_cache:
+                new_outline_cache[source_hash] = outline_cache[source_hash]
+            outline = outline_for(source, source_hash, new_outline_cache)
+        xref = xrefs.get(file_key) if xrefs is not None else None
+        sections.append((file_key, file_path, explanations, outline, xref,
+                         (workbooks or {}).get(file_key)))
+    
+    locales = list(entries[0][1]) if entries else [DEFAULT_LOCALE]
+    combined_paths = []
+    for locale in locales:
+        combined_path = os.path.join(locale_output_dir(output_path, locale), COMBINED_FILENAME)
+        write_combined_document(sections, combined_path, options, locale)
+        combined_paths.append(os.path.relpath(combined_path, output_path))
+    if options['outline']:
+        save_outline_cache(output_path, new_outline_cache)
+    elapsed = time.perf_counter() - start
+    
+    print()
+    print("=" * 60)
+    print(f"✓ Đã gộp {len(sections)} file vào: {', '.join(combined_paths)}")
+    if missing_count > 0:
+        print(f"✗ Thất bại: {missing_count} tài liệu")
+    print(f"📁 Vị trí lưu: {output_path}")
+    print(f"⏱ Thời gian: {elapsed:.2f}s")
     print("=" * 60)
+    return 0
+
+# Benchmark: synthetic sources of fixed sizes plus the real tree, timed per stage
+BENCHMARK_SIZES = (1_000, 10_000, 100_000)
+BENCHMARK_STAGES = ('discovery', 'read', 'build', 'save')
+
+def synthetic_dart_source(line_count):
+    """Generate a Dart source of exactly line_count lines with classes, methods,
+    string interpolation and comments, like a typical widget file"""
+    lines = ["import 'package:flutter/material.dart';", '']
+    index = 0
+    while len(lines) < line_count:
+        lines.extend([
+            f'/// Synthetic widget number {index}',
+            f'class Synthetic{index} extends StatelessWidget {{',
+            f'  const Synthetic{index}({{super.key}});',
+            '',
+            '  @override',
+            '  Widget build(BuildContext context) {',
+            f"    final label = 'Item {index}: ${{DateTime.now()}} <ok> & done';",
+            '    // Keep the row compact on small screens',
+            '    return Padding(padding: const EdgeInsets.all(8), child: Text(label));',
+            '  }',
+            '}',
+            '',
+        ])
+        index += 1
+    return '\n'.join(lines[:line_count]) + '\n'
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def benchmark_tree(lib_path, output_dir, options, engines=None):
+    """Time discovery once, then read/build/save for every file with each engine (all
+    of them unless engines names some)"""
+    start = time.perf_counter()
+    file_keys = discover_sources(lib_path, DEFAULT_INCLUDE, [])
+    discovery_time = time.perf_counter() - start
+    
+    line_count = 0
+    results = {}
+    for engine in engines or ENGINE_STAGES:
+        build, save = ENGINE_STAGES[engine]
+        stages = dict.fromkeys(BENCHMARK_STAGES, 0.0)
+        stages['discovery'] = discovery_time
+        line_count = 0
+        for file_key in file_keys:
+            file_path = os.path.join(lib_path, file_key)
+            
+            start = time.perf_counter()
+            with open(file_path, 'rb') as f:
+                source = f.read()
+            text = decode_source(source)
+            chunks = read_code_chunks(file_path, options, text)
+            stages['read'] += time.perf_counter() - start
+            line_count += source.count(b'\n')
+            
+            start = time.perf_counter()
+            outline = parse_dart_outline(text) if options['outline'] else None
+            document = build(file_path, file_key, file_explanations.get(file_key, LOCALE_TEXT[DEFAULT_LOCALE]['fallback']),
+                             options, outline, code=ENGINE_CODE[engine](chunks, options))
+            stages['build'] += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            save(document, os.path.join(output_dir, output_filename_for(file_key)), options)
+            stages['save'] += time.perf_counter() - start
+            del document
+        
+        total = sum(stages.values())
+        results[engine] = {
+            'files': len(file_keys),
+            'lines': line_count,
+            'stages_s': {stage: round(value, 4) for stage, value in stages.items()},
+            'total_s': round(total, 4),
+            'files_per_s': round(len(file_keys) / total, 1) if total else None,
+            'lines_per_s': round(line_count / total) if total else None,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    return results
+
+def benchmark_case(lib_path, output_dir, options, engine):
+    """Run benchmark_tree for one engine in a fresh interpreter, so that the peak RSS it
+    reports belongs to this case alone; the base document is built before timing"""
+    import subprocess
+    
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    code = (f"import json, sys; sys.path.insert(0, {script_dir!r}); import generate_word_docs; "
+            "generate_word_docs.fast_parts(); "
+            "print(json.dumps(generate_word_docs.benchmark_tree(*json.loads(sys.argv[1]))))")
+    completed = subprocess.run([sys.executable, '-c', code,
+                                json.dumps([lib_path, output_dir, options, [engine]])],
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.splitlines()[-1])[engine]
+
+COLD_START_REPEATS = 3
+
+def _time_python(*args):
+    """Best wall time over COLD_START_REPEATS fresh interpreters, and the last stdout"""
+    import subprocess
+    
+    best = None
+    for _ in range(COLD_START_REPEATS):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, *args], capture_output=True, text=True,
+                                   check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 3), completed.stdout
+
+def measure_cold_start(lib_path, output_dir):
+    """Time what a CI call pays before any document is built: the bare interpreter,
+    importing this script, importing python-docx, and a whole run with nothing to do"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    argv = ['generate_word_docs.py', '--lib', lib_path, '-o', output_dir, '--engine', 'fast']
+    run_code = (f"import sys; sys.path.insert(0, {script_dir!r}); sys.argv = {argv!r}; "
+                "import generate_word_docs; generate_word_docs.main(sys.argv[1:]); "
+                "print('docx' in sys.modules)")
+    # First run builds everything, so the timed runs only find up-to-date outputs
+    _, _ = _time_python('-c', run_code)
+    interpreter_s, _ = _time_python('-c', 'pass')
+    import_s, _ = _time_python('-c', f"import sys; sys.path.insert(0, {script_dir!r}); "
+                                     "import generate_word_docs")
+    docx_import_s, _ = _time_python('-c', 'import docx')
+    up_to_date_s, stdout = _time_python('-c', run_code)
+    return {
+        'interpreter_s': interpreter_s,
+        'import_s': import_s,
+        'docx_import_s': docx_import_s,
+        'up_to_date_run_s': up_to_date_s,
+        'docx_loaded_when_up_to_date': stdout.strip().splitlines()[-1] == 'True',
+    }
+
+def run_benchmark(lib_path, options, json_path, baseline_path=None):
+    """Benchmark synthetic sources and the real tree, write JSON and compare to a baseline"""
+    import platform
+    
+    cases = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in BENCHMARK_SIZES:
+            case_lib = os.path.join(tmp_dir, f'synthetic_{size}', 'lib')
+            os.makedirs(case_lib)
+            with open(os.path.join(case_lib, f'synthetic_{size}.dart'), 'w', encoding='utf-8') as f:
+                f.write(synthetic_dart_source(size))
+            cases[f'synthetic_{size // 1000}k'] = case_lib
+        if os.path.isdir(lib_path):
+            cases['lib'] = lib_path
+        
+        results = {}
+        for case, case_lib in cases.items():
+            case_output = os.path.join(tmp_dir, 'out', case)
+            os.makedirs(case_output)
+            results[case] = {engine: benchmark_case(case_lib, case_output, options, engine)
+                             for engine in ENGINE_STAGES}
+        cold_start = measure_cold_start(cases.get('lib', case_lib),
+                                        os.path.join(tmp_dir, 'out', 'cold_start'))
+    
+    report = {
+        'generator_version': GENERATOR_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': options,
+        'cases': results,
+        'cold_start': cold_start,
+    }
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    baseline = {}
+    baseline_cold_start = {}
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline_report = json.load(f)
+        baseline = baseline_report.get('cases', {})
+        baseline_cold_start = baseline_report.get('cold_start', {})
+    
+    print(f"{'case':<16}{'engine':<8}" + ''.join(f'{stage:>11}' for stage in BENCHMARK_STAGES) +
+          f"{'files/s':>10}{'lines/s':>11}{'RSS MB':>9}" + (f"{'vs base':>9}" if baseline else ''))
+    for case, engines in results.items():
+        for engine, result in engines.items():
+            row = f'{case:<16}{engine:<8}'
+            row += ''.join(f"{result['stages_s'][stage]:>10.3f}s" for stage in BENCHMARK_STAGES)
+            row += f"{result['files_per_s'] or 0:>10.1f}{result['lines_per_s'] or 0:>11}"
+            row += f"{result['peak_rss_mb'] or 0:>9.1f}"
+            base = baseline.get(case, {}).get(engine)
+            if base and base.get('total_s'):
+                row += f"{result['total_s'] / base['total_s']:>8.2f}x"
+            print(row)
+    
+    row = (f"Khởi động: python {cold_start['interpreter_s']:.3f}s, import {cold_start['import_s']:.3f}s, "
+           f"python-docx {cold_start['docx_import_s']:.3f}s, "
+           f"chạy không có gì thay đổi {cold_start['up_to_date_run_s']:.3f}s "
+           f"(python-docx {'có' if cold_start['docx_loaded_when_up_to_date'] else 'không'} được nạp)")
+    if baseline_cold_start.get('up_to_date_run_s'):
+        row += f", {cold_start['up_to_date_run_s'] / baseline_cold_start['up_to_date_run_s']:.2f}x so với base"
+    print(row)
+    print(f"📁 Kết quả benchmark: {json_path}")
+    return 0
+
+def parse_locales(value):
+    locales = list(dict.fromkeys(locale.strip() for locale in value.split(',') if locale.strip()))
+    unknown = [locale for locale in locales if locale not in LOCALE_TEXT]
+    if not locales or unknown:
+        raise argparse.ArgumentTypeError(
+            f"ngôn ngữ không hỗ trợ: {', '.join(unknown) or value!r} (có: {', '.join(LOCALE_TEXT)})")
+    return locales
+
+def parse_formats(value):
+    formats = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in formats if name not in RENDERERS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(
+            f"định dạng không hỗ trợ: {', '.join(unknown) or value!r} (có: {', '.join(RENDERERS)})")
+    return formats
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo tài liệu Word cho các file Dart trong lib/")
+    parser.add_argument('--lib', default=DEFAULT_LIB_PATH,
+                        help=f"thư mục mã nguồn Dart (mặc định: {DEFAULT_LIB_PATH})")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT_PATH,
+                        help=f"thư mục lưu tài liệu (mặc định: {DEFAULT_OUTPUT_PATH})")
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help="chỉ lấy file khớp mẫu, tính từ thư mục lib (mặc định: *.dart)")
+    parser.add_argument('--exclude', action='append', metavar='GLOB', default=[],
+                        help="bỏ qua file khớp mẫu, ví dụ 'l10n/*'")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="số tiến trình song song (0 = số lõi CPU, mặc định: 1)")
+    parser.add_argument('-f', '--force', action='store_true',
+                        help="tạo lại mọi tài liệu, bỏ qua manifest")
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help="chỉ liệt kê các tài liệu cần tạo lại, không ghi file")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="đọc nguồn, tạo tài liệu và ghi file song song theo dây chuyền "
+                             "(có lợi khi thư mục nằm trên ổ mạng)")
+    parser.add_argument('--pipeline-depth', type=int, default=DEFAULT_PIPELINE_DEPTH, metavar='N',
+                        help="số tài liệu tối đa đã tạo nhưng chưa ghi khi --pipeline "
+                             f"(mặc định: {DEFAULT_PIPELINE_DEPTH})")
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help="thời gian tối đa cho mỗi file; mỗi file được tạo trong một tiến trình "
+                             "con riêng, quá hạn thì dừng và ghi nhận lỗi")
+    parser.add_argument('--max-memory', type=int, metavar='MB',
+                        help="giới hạn bộ nhớ (không gian địa chỉ) của tiến trình con tạo mỗi file; "
+                             "chỉ hỗ trợ trên Linux/macOS")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="chỉ tạo lại các file bị lỗi ở lần chạy trước")
+    parser.add_argument('--code-chunk-lines', type=int, default=DEFAULT_CODE_CHUNK_LINES,
+                        help="số dòng mã nguồn mỗi đoạn (0 = một đoạn duy nhất, "
+                             f"mặc định: {DEFAULT_CODE_CHUNK_LINES})")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='docx',
+                        help="bộ tạo tài liệu: docx (python-docx) hoặc fast (ghi OOXML trực tiếp)")
+    parser.add_argument('--formats', type=parse_formats, default=DEFAULT_FORMATS, metavar='LIST',
+                        help=f"các định dạng cần tạo trong cùng một lần chạy, cách nhau bởi dấu phẩy "
+                             f"({', '.join(RENDERERS)}; mặc định: {','.join(DEFAULT_FORMATS)}); "
+                             f"html kèm trang {HTML_INDEX_FILENAME}")
+    parser.add_argument('--no-outline', dest='outline', action='store_false',
+                        help="không tự động trích xuất cấu trúc mã nguồn vào phần giải thích")
+    parser.add_argument('--no-xref', dest='xref', action='store_false',
+                        help="không thêm phần \"phụ thuộc / được dùng bởi\" lấy từ các import")
+    parser.add_argument('--no-workbooks', dest='workbooks', action='store_false',
+                        help="không thêm cấu trúc cột và dòng mẫu của các file Excel mẫu "
+                             "vào tài liệu của dịch vụ nhập Excel")
+    parser.add_argument('--workbook-rows', type=int, default=DEFAULT_WORKBOOK_ROWS, metavar='N',
+                        help=f"số dòng mẫu lấy từ mỗi file Excel (mặc định: {DEFAULT_WORKBOOK_ROWS})")
+    parser.add_argument('--no-l10n', dest='l10n', action='store_false',
+                        help=f"không tạo phụ lục chuỗi đa ngôn ngữ ({L10N_APPENDIX_FILENAME}) "
+                             "từ các file ARB trong lib/l10n")
+    parser.add_argument('--highlight', action='store_true',
+                        help="tô màu cú pháp Dart trong phần mã nguồn, dùng font đơn cách")
+    parser.add_argument('--reproducible', action='store_true',
+                        help="tạo file .docx giống hệt nhau byte-by-byte với cùng đầu vào "
+                             "(cố định thời gian, thứ tự mục zip và ngày trong metadata)")
+    parser.add_argument('--compress-level', type=int, choices=range(10), default=DEFAULT_COMPRESS_LEVEL,
+                        metavar='0-9',
+                        help=f"mức nén zip, 0 = không nén (mặc định: {DEFAULT_COMPRESS_LEVEL})")
+    parser.add_argument('--combined', action='store_true',
+                        help=f"gộp mọi file vào một cuốn sổ tay duy nhất ({COMBINED_FILENAME}) có mục lục")
+    parser.add_argument('--watch', action='store_true',
+                        help="chạy liên tục, tự tạo lại tài liệu khi file nguồn thay đổi")
+    parser.add_argument('--watch-interval', type=float, default=0.5, metavar='SECONDS',
+                        help="chu kỳ kiểm tra thay đổi khi --watch (mặc định: 0.5)")
+    parser.add_argument('--profile', action='store_true',
+                        help="đo thời gian và bộ nhớ cấp phát theo từng giai đoạn, in các file chậm nhất")
+    parser.add_argument('--profile-dump', metavar='PATH',
+                        help="ghi kết quả cProfile (pstats) của tiến trình chính ra file")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="đo hiệu năng trên mã nguồn giả lập 1k/10k/100k dòng và thư mục lib")
+    parser.add_argument('--benchmark-json', default='benchmark_results.json', metavar='PATH',
+                        help="nơi ghi kết quả benchmark dạng JSON (mặc định: benchmark_results.json)")
+    parser.add_argument('--baseline', metavar='PATH',
+                        help="file JSON benchmark trước đó để so sánh")
+    parser.add_argument('--locales', type=parse_locales, default=[DEFAULT_LOCALE], metavar='LIST',
+                        help=f"các ngôn ngữ cần tạo, cách nhau bởi dấu phẩy ({', '.join(LOCALE_TEXT)}; "
+                             f"mặc định: {DEFAULT_LOCALE}); ngôn ngữ khác {DEFAULT_LOCALE} "
+                             "được lưu vào thư mục con cùng tên")
+    parser.add_argument('--check', action='store_true',
+                        help="chỉ kiểm tra tài liệu đã có còn khớp với mã nguồn không "
+                             "(không tạo file), thoát với mã 1 nếu có tài liệu lỗi thời")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="chỉ tạo phân đoạn I trong N (chia theo dung lượng mã nguồn) và ghi "
+                             "manifest riêng của phân đoạn; mỗi phân đoạn nên dùng thư mục -o riêng")
+    parser.add_argument('--merge-shards', nargs='+', metavar='DIR',
+                        help="gộp kết quả và manifest của các thư mục phân đoạn vào thư mục -o, "
+                             "in một bản tổng kết chung")
+    parser.add_argument('--compare-engines', action='store_true',
+                        help="tạo mỗi file bằng mọi engine, so sánh nội dung rồi thoát")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.profile:
+        # tracemalloc is process-wide, so the --pipeline threads would measure each
+        # other's allocations; only time is profiled there
+        enable_profiling(track_memory=not args.pipeline)
+    options = {
+        'code_chunk_lines': max(args.code_chunk_lines, 0),
+        'engine': args.engine,
+        'formats': args.formats,
+        'outline': args.outline,
+        'xref': args.xref,
+        'workbooks': args.workbooks,
+        'workbook_rows': max(args.workbook_rows, 0),
+        'highlight': args.highlight,
+        'reproducible': args.reproducible,
+        'compress_level': args.compress_level,
+    }
+    
+    lib_path = args.lib
+    output_path = args.output
+    
+    if args.dry_run and (args.combined or args.watch or args.benchmark or args.compare_engines
+                         or args.check or args.merge_shards):
+        sys.exit("✗ --dry-run chỉ dùng cho chế độ tạo tài liệu thông thường")
+    if (args.shard or args.merge_shards) and (args.combined or args.watch or args.benchmark
+                                              or args.compare_engines or args.check):
+        sys.exit("✗ --shard và --merge-shards chỉ dùng cho chế độ tạo tài liệu thông thường")
+    if (args.timeout or args.max_memory) and args.pipeline:
+        sys.exit("✗ --timeout và --max-memory không dùng cùng --pipeline")
+    if args.max_memory and importlib.util.find_spec('resource') is None:
+        print("⚠ --max-memory không được hỗ trợ trên hệ điều hành này, bỏ qua giới hạn bộ nhớ")
+    if args.shard and args.merge_shards:
+        sys.exit("✗ Chạy --merge-shards sau khi mọi phân đoạn --shard đã xong")
+    # Every other mode builds documents unconditionally
+    if args.benchmark or args.compare_engines or args.combined or args.watch:
+        require_docx()
+    
+    if args.benchmark:
+        return run_benchmark(lib_path, options, args.benchmark_json, args.baseline)
+    
+    # Create output directories, one subdirectory per non-default locale
+    if not args.dry_run and not args.check:
+        for locale in args.locales:
+            os.makedirs(locale_output_dir(output_path, locale), exist_ok=True)
+    
+    tables = load_explanation_tables(args.locales)
+    discovery_cache = os.path.join(output_path, DISCOVERY_CACHE_FILENAME)
+    discovered = discover_sources(lib_path, args.include or DEFAULT_INCLUDE, args.exclude,
+                                  discovery_cache if os.path.isdir(output_path)
+                                  and not (args.check or args.dry_run) else None)
+    entries = collect_entries(discovered, args.include or DEFAULT_INCLUDE, args.exclude, tables)
+    if args.check:
+        return run_check(entries, lib_path, output_path, args.locales,
+                         discover_sources(lib_path, ['*'], []))
+    if args.merge_shards:
+        success_count, skipped_count, fail_count, elapsed = merge_shards(args.merge_shards, output_path)
+        if 'html' in options['formats']:
+            write_html_index(entries, output_path, args.locales)
+        print_summary(success_count, skipped_count, fail_count, output_path, elapsed)
+        if args.l10n:
+            report_l10n_appendix(run_l10n_appendix(lib_path, output_path, options, args.locales,
+                                                   force=args.force))
+        return 0
+    xrefs = None
+    if options['xref']:
+        xrefs = project_import_graph(lib_path, output_path, dry_run=args.dry_run)
+    workbooks = None
+    if options['workbooks']:
+        workbooks = project_workbooks(lib_path, [file_key for file_key, _ in entries], output_path,
+                                      options['workbook_rows'], dry_run=args.dry_run)
+    
+    if args.compare_engines:
+        return run_engine_comparison(lib_path, entries, options, xrefs, workbooks)
+    
+    manifest_filename = MANIFEST_FILENAME
+    if args.shard:
+        # The import graph above still covers every file, so cross-references match an
+        # unsharded run; the workbooks stay with the shard that owns their service file
+        entries, shard_bytes, total_bytes = shard_entries(entries, lib_path, *args.shard)
+        manifest_filename = shard_manifest_filename(*args.shard)
+    
+    print("=" * 60)
+    print("Bắt đầu tạo tài liệu Word...")
+    if jobs > 1 and not args.combined:
+        print(f"Chạy song song với {jobs} tiến trình")
+    if args.pipeline and not args.combined:
+        print(f"Chạy theo dây chuyền đọc → tạo → ghi (tối đa {args.pipeline_depth} tài liệu chờ ghi)")
+    if args.shard:
+        print(f"Phân đoạn {args.shard[0]}/{args.shard[1]}: {len(entries)} file, "
+              f"{shard_bytes / 1024:.0f}/{total_bytes / 1024:.0f} KB mã nguồn")
+    print("=" * 60)
+    print()
+    
+    if args.combined:
+        return run_combined_build(entries, lib_path, output_path, options, xrefs, workbooks)
+    
+    start = time.perf_counter()
+    if args.profile_dump:
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    
+    # A run narrowed by --include/--exclude keeps the records of the files it left out
+    success_count, skipped_count, fail_count = run_build(
+        entries, lib_path, output_path, options, jobs, force=args.force,
+        prune=not (args.include or args.exclude), dry_run=args.dry_run,
+        pipeline_depth=max(args.pipeline_depth, 1) if args.pipeline else 0, xrefs=xrefs,
+        manifest_filename=manifest_filename,
+        budget=(args.timeout, args.max_memory) if args.timeout or args.max_memory else None,
+        retry_failed=args.retry_failed, workbooks=workbooks)
+    
+    if args.profile_dump:
+        cprofile.disable()
+        cprofile.dump_stats(args.profile_dump)
+    elapsed = time.perf_counter() - start
+    
+    if args.shard and not args.dry_run:
+        # Recorded for --merge-shards, which prints one summary for all shards
+        summary = {'success': success_count, 'skipped': skipped_count, 'failed': fail_count,
+                   'elapsed': round(elapsed, 3)}
+        save_manifest(output_path, load_manifest(output_path, manifest_filename), manifest_filename,
+                      summary)
+    if 'html' in options['formats'] and not args.dry_run and not args.shard:
+        write_html_index(entries, output_path, args.locales)
+    print_summary(success_count, skipped_count, fail_count, output_path, elapsed, args.dry_run)
+    
+    # Project-wide documents are left to --merge-shards
+    if args.l10n and not args.shard:
+        report_l10n_appendix(run_l10n_appendix(lib_path, output_path, options, args.locales,
+                                               force=args.force, dry_run=args.dry_run))
+    
+    if _profiler is not None:
+        _profiler.print_report()
+    if args.profile_dump:
+        import pstats
+        print()
+        pstats.Stats(args.profile_dump).sort_stats('cumulative').print_stats(20)
+    
+    if args.watch:
+        return watch_sources(lib_path, output_path, options, tables,
+                             args.include or DEFAULT_INCLUDE, args.exclude, args.watch_interval,
+                             xrefs=xrefs, workbooks=workbooks)
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
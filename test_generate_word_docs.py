@@ -0,0 +1,263 @@
+"""
+Tests for generate_word_docs.py: run with `python -m unittest test_generate_word_docs`
+(or pytest) from the repository root
+"""
+
+import os
+import tempfile
+import unittest
+import zipfile
+
+import generate_word_docs as gen
+
+# Escaping, tabs, blank lines at chunk boundaries, interpolation, annotations and a
+# multi-line string crossing a chunk boundary
+SAMPLE_SOURCE = '''import 'package:flutter/material.dart';
+
+/// Doc comment with <markup> & "quotes"
+@immutable
+class Sample<T> extends StatelessWidget {
+\tfinal String name = 'Thiết bị ${1 + 2} & <b>';
+
+
+  static const text = """first line
+
+third line""";
+  int count(List<T> items) => items.length; // trailing comment
+}
+
+'''
+
+SAMPLE_XREF = {'depends_on': ['models/equipment.dart'], 'used_by': []}
+
+SAMPLE_WORKBOOKS = [{
+    'name': 'sample.xlsx',
+    'sheet': 'Sheet1',
+    'rows': 2,
+    'columns': [
+        {'letter': 'A', 'header': 'STT', 'types': ['int'], 'nulls': 0},
+        {'letter': 'B', 'header': 'Tên <thiết bị>', 'types': ['str', 'int'], 'nulls': 1},
+    ],
+    'sample': [['1', 'Máy in & máy quét'], ['2', '']],
+}]
+
+
+def build_options(**overrides):
+    options = {
+        'code_chunk_lines': 3,
+        'engine': 'docx',
+        'formats': ['docx'],
+        'outline': True,
+        'xref': True,
+        'workbooks': True,
+        'workbook_rows': gen.DEFAULT_WORKBOOK_ROWS,
+        'highlight': False,
+        'reproducible': False,
+        'compress_level': gen.DEFAULT_COMPRESS_LEVEL,
+    }
+    options.update(overrides)
+    return options
+
+
+class SourceTestCase(unittest.TestCase):
+    """Writes SAMPLE_SOURCE to a temporary lib/ directory"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = self._tmp.name
+        self.file_key = 'widgets/sample.dart'
+        self.file_path = os.path.join(self.tmp_dir, 'lib', self.file_key)
+        os.makedirs(os.path.dirname(self.file_path))
+        with open(self.file_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(SAMPLE_SOURCE)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def build(self, engine, options, **kwargs):
+        output_dir = os.path.join(self.tmp_dir, 'out', engine)
+        os.makedirs(output_dir, exist_ok=True)
+        outline = gen.parse_dart_outline(SAMPLE_SOURCE)
+        return gen.ENGINES[engine](self.file_path, self.file_key, 'Giải thích\ndòng hai', output_dir,
+                                   options, outline, **kwargs)
+
+
+class EngineEquivalenceTest(SourceTestCase):
+    """The fast engine must produce the same body as python-docx, tables and run styles
+    included"""
+
+    def assert_same_body(self, options, **kwargs):
+        bodies = {engine: gen.document_body(self.build(engine, options, **kwargs))
+                  for engine in gen.ENGINES}
+        for engine, body in bodies.items():
+            self.assertEqual(body, bodies['docx'], f'{engine} differs from docx')
+        return bodies['docx']
+
+    def test_plain_code(self):
+        body = self.assert_same_body(build_options())
+        code = [runs for kind, style, runs, *_ in body
+                if kind == 'p' and style == gen.CODE_STYLE.replace(' ', '')]
+        self.assertEqual('\n'.join(text for runs in code for _, text in runs),
+                         SAMPLE_SOURCE[:-1])
+
+    def test_highlighted_code(self):
+        body = self.assert_same_body(build_options(highlight=True))
+        run_styles = {style for kind, _, runs, *_ in body if kind == 'p' for style, _ in runs}
+        for style_name, *_ in gen.HIGHLIGHT_STYLES.values():
+            self.assertIn(style_name.replace(' ', ''), run_styles)
+
+    def test_locales(self):
+        for locale in gen.LOCALE_TEXT:
+            with self.subTest(locale=locale):
+                self.assert_same_body(build_options(), locale=locale)
+
+    def test_xref_workbooks_and_source_bookmark(self):
+        body = self.assert_same_body(build_options(), xref=SAMPLE_XREF, workbooks=SAMPLE_WORKBOOKS,
+                                     source_hash=gen.hash_bytes(SAMPLE_SOURCE.encode('utf-8')))
+        tables = [item for item in body if item[0] == 'tbl']
+        # A schema table and a sample table, each with a repeated header row
+        self.assertEqual(len(tables), 2)
+        self.assertEqual(tables[0][2], [True, False, False])
+        self.assertEqual(tables[1][3], [['STT', 'Tên <thiết bị>'], ['1', 'Máy in & máy quét'],
+                                        ['2', '']])
+        bookmarks = [name for kind, _, _, names, _ in (item for item in body if item[0] == 'p')
+                     for name in names]
+        self.assertEqual(bookmarks, [gen.source_bookmark_name(
+            gen.hash_bytes(SAMPLE_SOURCE.encode('utf-8')))])
+
+    def test_compare_engines(self):
+        options = build_options(highlight=True)
+        self.assertEqual(gen.compare_engines(self.file_path, self.file_key, 'Giải thích', options,
+                                             xref=SAMPLE_XREF, workbooks=SAMPLE_WORKBOOKS), [])
+
+
+class CodeChunkTest(unittest.TestCase):
+    SOURCE = 'a\n\n\nb\n\nc\n\n'
+
+    def test_blank_lines_at_chunk_ends_are_kept(self):
+        for chunk_lines in (0, 1, 2, 3):
+            with self.subTest(chunk_lines=chunk_lines):
+                chunks = list(gen.iter_code_chunks(self.SOURCE.splitlines(True), chunk_lines))
+                self.assertEqual('\n'.join(chunks), self.SOURCE[:-1])
+
+    def test_highlighted_chunks_cut_like_plain_ones(self):
+        for chunk_lines in (0, 1, 2, 3):
+            with self.subTest(chunk_lines=chunk_lines):
+                plain = list(gen.iter_code_chunks(self.SOURCE.splitlines(True), chunk_lines))
+                highlighted = [gen.chunk_text(runs)
+                               for runs in gen.iter_highlighted_chunks(self.SOURCE, chunk_lines)]
+                self.assertEqual(highlighted, plain)
+
+
+# The parts of a workbook the summary reads: shared and inline strings, a date style, a
+# boolean, a never-calculated formula, a column gap and an empty row
+SHEET_NAMESPACE = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+RELATIONSHIP_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+WORKBOOK_PARTS = {
+    '_rels/.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{RELATIONSHIP_TYPE}officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        f'<workbook {SHEET_NAMESPACE} xmlns:r="http://schemas.openxmlformats.org/officeDocument/'
+        '2006/relationships"><sheets><sheet name="Thiết bị" sheetId="1" r:id="rId1"/>'
+        '</sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{RELATIONSHIP_TYPE}worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{RELATIONSHIP_TYPE}sharedStrings" Target="sharedStrings.xml"/>'
+        f'<Relationship Id="rId3" Type="{RELATIONSHIP_TYPE}styles" Target="/xl/styles.xml"/>'
+        '</Relationships>'),
+    'xl/sharedStrings.xml': (
+        f'<sst {SHEET_NAMESPACE}><si><t>STT</t></si><si><t>Tên</t></si>'
+        '<si><r><t>Máy </t></r><r><t>in</t></r></si><si><t>Ngày</t></si></sst>'),
+    'xl/styles.xml': (
+        f'<styleSheet {SHEET_NAMESPACE}><cellXfs><xf numFmtId="0"/><xf numFmtId="14"/></cellXfs>'
+        '</styleSheet>'),
+    'xl/worksheets/sheet1.xml': (
+        f'<worksheet {SHEET_NAMESPACE}><sheetData>'
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c>'
+        '<c r="D1" t="s"><v>3</v></c><c r="E1" t="inlineStr"><is><t>Đạt</t></is></c></row>'
+        '<row r="2"><c r="A2"><v>1</v></c><c r="B2" t="s"><v>2</v></c>'
+        '<c r="D2" s="1"><v>45292</v></c><c r="E2" t="b"><v>1</v></c></row>'
+        '<row r="3"/>'
+        '<row r="4"><c r="A4"><v>2.5</v></c><c r="B4" t="inlineStr"><is><t>Máy quét</t></is></c>'
+        '<c r="E4"><f>1=1</f><v></v></c></row>'
+        '</sheetData></worksheet>'),
+}
+
+
+class WorkbookTest(unittest.TestCase):
+
+    def test_first_sheet_is_summarized(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sample.xlsx')
+            with zipfile.ZipFile(path, 'w') as archive:
+                for name, xml in WORKBOOK_PARTS.items():
+                    archive.writestr(name, xml)
+            summary = gen.summarize_workbook(path, 5)
+        self.assertEqual(summary['sheet'], 'Thiết bị')
+        self.assertEqual(summary['rows'], 2)
+        self.assertEqual([(column['letter'], column['header'], column['types'], column['nulls'])
+                          for column in summary['columns']],
+                         [('A', 'STT', ['float', 'int'], 0), ('B', 'Tên', ['str'], 0),
+                          ('C', '', [], 2), ('D', 'Ngày', ['datetime'], 1),
+                          ('E', 'Đạt', ['bool'], 1)])
+        self.assertEqual(summary['sample'], [['1', 'Máy in', '', '2024-01-01 00:00:00', 'True'],
+                                             ['2.5', 'Máy quét', '', '', '']])
+
+
+class CheckTest(SourceTestCase):
+
+    def test_fresh_document_matches_and_edit_is_detected(self):
+        document_path = self.build('fast', build_options(),
+                                   source_hash=gen.hash_bytes(SAMPLE_SOURCE.encode('utf-8')))
+        self.assertIsNone(gen.check_document(document_path, self.file_path))
+        with open(self.file_path, 'a', encoding='utf-8') as f:
+            f.write('// edited\n')
+        self.assertEqual(gen.check_document(document_path, self.file_path), 'code_changed')
+
+    def test_document_without_bookmark_compares_exact_text(self):
+        document_path = self.build('fast', build_options())
+        self.assertIsNone(gen.check_document(document_path, self.file_path))
+        # Only a blank line is added: still drift
+        with open(self.file_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(SAMPLE_SOURCE.replace('\n\n', '\n\n\n', 1))
+        self.assertEqual(gen.check_document(document_path, self.file_path), 'code_changed')
+
+    def test_baseline_document_with_final_newline_matches(self):
+        # The first generator wrote the whole file, final newline included, into a single
+        # code paragraph; a source with one more newline renders exactly that text
+        baseline_path = os.path.join(self.tmp_dir, 'lib', 'baseline.dart')
+        with open(baseline_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(SAMPLE_SOURCE + '\n')
+        output_dir = os.path.join(self.tmp_dir, 'out', 'baseline')
+        os.makedirs(output_dir)
+        document_path = gen.create_word_document_fast(baseline_path, self.file_key, 'Giải thích',
+                                                      output_dir, build_options(code_chunk_lines=0))
+        self.assertEqual(gen.read_document_source(document_path), (None, SAMPLE_SOURCE))
+        self.assertIsNone(gen.check_document(document_path, self.file_path))
+
+    def test_narrowed_check_reports_no_strays(self):
+        lib_path = os.path.join(self.tmp_dir, 'lib')
+        output_dir = os.path.join(self.tmp_dir, 'out')
+        other_key = 'models/other.dart'
+        os.makedirs(os.path.join(lib_path, 'models'))
+        with open(os.path.join(lib_path, other_key), 'w', encoding='utf-8') as f:
+            f.write('class Other {}\n')
+        os.makedirs(output_dir)
+        entries = [(file_key, {gen.DEFAULT_LOCALE: 'Giải thích'})
+                   for file_key in (self.file_key, other_key)]
+        self.assertEqual(gen.run_build(entries, lib_path, output_dir,
+                                       build_options(engine='fast', xref=False)), (2, 0, 0))
+        sources = gen.discover_sources(lib_path, ['*'], [])
+        self.assertEqual(gen.run_check(entries[:1], lib_path, output_dir, [gen.DEFAULT_LOCALE],
+                                       sources), 0)
+        os.remove(os.path.join(lib_path, other_key))
+        sources = gen.discover_sources(lib_path, ['*'], [])
+        self.assertEqual(gen.run_check(entries[:1], lib_path, output_dir, [gen.DEFAULT_LOCALE],
+                                       sources), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()